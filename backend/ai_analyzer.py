@@ -4,64 +4,12 @@ AI TikTok Analyzer - Just enter URL and get analysis!
 """
 
 import sys
-import os
 sys.path.append('src')
-from data_collector import TikTokDataCollector
 from feature_extractor import TikTokFeatureExtractor
-from simple_model import TikTokModelTrainer
+from train_model import load_or_train_model
+from simple_tiktok_downloader import download_tiktok_video
 import numpy as np
-import torch
 import random
-import subprocess
-
-def download_tiktok_video(url, output_dir="data/videos"):
-    """Download TikTok video using yt-dlp"""
-    
-    # Create output directory
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Change to output directory
-    original_dir = os.getcwd()
-    os.chdir(output_dir)
-    
-    try:
-        # Use yt-dlp command line
-        cmd = [
-            'yt-dlp',
-            '--format', 'best',
-            '--output', '%(title)s.%(ext)s',
-            '--no-playlist',
-            url
-        ]
-        
-        print(f"📱 Downloading TikTok video...")
-        
-        # Run the download command
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            print("✅ Download successful!")
-            
-            # Find the downloaded file
-            files = [f for f in os.listdir('.') if f.endswith(('.mp4', '.webm', '.mkv'))]
-            if files:
-                # Get the most recent file
-                latest_file = max(files, key=lambda x: os.path.getctime(x))
-                print(f"📁 Downloaded: {latest_file}")
-                return os.path.join(output_dir, latest_file), latest_file
-            else:
-                print("❌ No video file found")
-                return None, None
-        else:
-            print(f"❌ Download failed: {result.stderr}")
-            return None, None
-            
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        return None, None
-    finally:
-        # Change back to original directory
-        os.chdir(original_dir)
 
 def analyze_video_with_ai(video_path, description=""):
     """Use AI to analyze video and generate realistic scores"""
@@ -72,66 +20,18 @@ def analyze_video_with_ai(video_path, description=""):
         # Extract features from the video
         extractor = TikTokFeatureExtractor()
         
-        # Get video features
-        video_features = extractor.extract_video_features(video_path)
-        audio_features = extractor.extract_audio_features(video_path)
-        text_features = extractor.extract_text_features(description if description else "TikTok video")
-        
-        # Combine features
-        combined_features = np.concatenate([video_features, audio_features, text_features])
+        # Load the saved model artifact (retrains only if missing or stale)
+        trainer = load_or_train_model(extractor=extractor)
         
-        # Load trained model
-        trainer = TikTokModelTrainer()
-        
-        # Check if we have enough training data
-        collector = TikTokDataCollector()
-        dataset = collector.get_dataset()
-        
-        if len(dataset) < 2:
-            print("⚠️  Not enough training data. Using heuristic scoring...")
+        if trainer is None:
+            print("⚠️  No trained model available. Using heuristic scoring...")
             return analyze_video_with_heuristics(video_path, description)
         
-        # Train model if not already trained
-        print("🔄 Preparing model for prediction...")
-        
-        # Get training data
-        all_features = []
-        all_scores = []
-        
-        for _, row in dataset.iterrows():
-            try:
-                # Extract features for each training video
-                vf = extractor.extract_video_features(row['video_path'])
-                af = extractor.extract_audio_features(row['video_path'])
-                tf = extractor.extract_text_features(row['description'])
-                
-                features = np.concatenate([vf, af, tf])
-                scores = [row['accuracy'], row['homogeneity'], row['comedy'], row['theatrism'], row['coherence']]
-                
-                all_features.append(features)
-                all_scores.append(scores)
-                
-            except Exception as e:
-                print(f"⚠️  Skipping training video due to error: {e}")
-                continue
-        
-        if len(all_features) < 2:
-            print("⚠️  Not enough valid training data. Using heuristic scoring...")
-            return analyze_video_with_heuristics(video_path, description)
-        
-        # Convert to numpy arrays
-        X = np.array(all_features)
-        y = np.array(all_scores)
-        
-        # Train model
-        X_train, X_test, y_train, y_test = trainer.prepare_data(X, y)
-        trainer.train(X_train, y_train, epochs=50)  # Quick training
+        # Get the combined video, audio and text features
+        combined_features = extractor.extract_all(video_path, description if description else "TikTok video")
         
         # Make prediction
-        features_tensor = torch.FloatTensor(combined_features.reshape(1, -1))
-        with torch.no_grad():
-            prediction = trainer.model(features_tensor)
-            predicted_scores = prediction.numpy()[0]
+        predicted_scores = trainer.predict(combined_features.reshape(1, -1))[0]
         
         # Apply realistic scoring with randomization and content-based adjustments
         scores = apply_realistic_scoring(predicted_scores, description)
@@ -4,132 +4,304 @@ BYTEME Web API Server
 Connects the web app to the AI TikTok analyzer
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
 import sys
-import subprocess
 import json
-import tempfile
-import shutil
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Add src directory to path (relative to webapp directory)
 sys.path.append('../src')
 
 # Import your AI analyzer components
+from feature_extractor import TikTokFeatureExtractor, UndecodableVideoError
+from train_model import load_or_train_model
+from job_queue import JobQueue, QueueFullError
+from download_manager import DownloadError, get_download_manager, video_key
+from result_cache import ResultCache, result_cache_key
+from model_artifacts import DEFAULT_ARTIFACT_DIR, read_latest_version
 from data_collector import TikTokDataCollector
-from feature_extractor import TikTokFeatureExtractor
-from simple_model import TikTokModelTrainer
-import numpy as np
-import torch
+from similarity_index import DUPLICATE_SIMILARITY, load_artifact_similarity_index
+from inference import load_inference_model
+from metrics import registry, timed, increment, request_scope, log_event
+from uploads import HashingRequest, MAX_UPLOAD_BYTES, uploaded_video
 import random
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for web app
+# Uploaded files are spooled to disk and hashed as they stream in (see uploads.py)
+app.request_class = HashingRequest
+
+# One JSON line per event; per-request stage timings come from metrics.request_scope
+logging.basicConfig(level=os.environ.get('BYTEME_LOG_LEVEL', 'INFO'), format='%(message)s')
+logger = logging.getLogger('byteme')
 
 # Global variables
 model_trainer = None
-feature_extractor = TikTokFeatureExtractor()
+model_lock = threading.Lock()
+feature_extractor = None
+feature_extractor_lock = threading.Lock()
+job_queue = None
+job_queue_lock = threading.Lock()
+similarity_index = None
+similarity_index_version = None
+similarity_index_lock = threading.Lock()
+similarity_synced_at = 0
+
+# The video every /api/analyze request is scored on (override e.g. for benchmarks)
+LOCAL_VIDEO_PATH = os.environ.get('BYTEME_LOCAL_VIDEO_PATH') or os.path.join(os.path.dirname(__file__), 'local_video.MP4')
+JOB_RETRY_AFTER_SECONDS = 5
+
+# Batch analysis limits; local paths are only accepted from the dataset's video folder
+MAX_BATCH_ITEMS = 50
+BATCH_EXTRACT_WORKERS = int(os.environ.get('BYTEME_BATCH_WORKERS', 4))
+BATCH_DOWNLOAD_WORKERS = 4
+MEDIA_ROOT = os.path.join('data', 'videos')
+DOWNLOAD_DIR = 'temp_videos'
+
+# Most neighbours one /api/similar request may ask for, and how often (seconds)
+# to index videos added to the dataset since the model's index was saved
+MAX_SIMILAR = 50
+SIMILARITY_SYNC_INTERVAL = 30
+
+# Room for the multipart boundaries and form fields around an upload of MAX_UPLOAD_BYTES
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+# Stages reported by /api/analyze/stream ('embedding' only with an embedding
+# model), and how often to send a keep-alive comment while one is still running
+STREAM_STAGES = ('download', 'video', 'audio', 'embedding', 'text', 'predict')
+STREAM_HEARTBEAT_SECONDS = 10
+
+# Finished analyses, keyed by video id, description and model artifact version.
+# Set BYTEME_RESULT_CACHE_DIR to keep them on disk across restarts
+result_cache = ResultCache(
+    max_entries=int(os.environ.get('BYTEME_RESULT_CACHE_SIZE', 1024)),
+    ttl=int(os.environ.get('BYTEME_RESULT_CACHE_TTL', 3600)),
+    disk_dir=os.environ.get('BYTEME_RESULT_CACHE_DIR') or None
+)
+
+# How often (seconds) to check whether a new model artifact has been deployed
+MODEL_CHECK_INTERVAL = 2
+model_checked_at = 0
+
+def get_feature_extractor():
+    """Create the feature extractor on first use rather than at import time"""
+    global feature_extractor
+    if feature_extractor is None:
+        with feature_extractor_lock:
+            if feature_extractor is None:
+                feature_extractor = TikTokFeatureExtractor()
+    return feature_extractor
+
+def get_model_trainer(train_if_missing=True):
+    """Load the model once per process, safely under concurrent requests
+    
+    With train_if_missing=False only an existing artifact is loaded - nothing is
+    trained, and None is returned if there is no usable model yet.
+    """
+    global model_trainer
+    if model_trainer is None:
+        with model_lock:
+            # Another thread may have loaded it while we waited for the lock
+            if model_trainer is None:
+                model_trainer = load_or_train_model(extractor=get_feature_extractor(),
+                                                    train_if_missing=train_if_missing)
+                if model_trainer is not None:
+                    log_event(logger, 'model_loaded', artifact_version=model_trainer.metadata.get('artifact_version'))
+    else:
+        reload_model_if_deployed()
+    return model_trainer
+
+def reload_model_if_deployed():
+    """Switch to a model artifact saved since this process loaded its model
+    
+    Cached results of the old model stop matching (the artifact version is part
+    of the key), and the in-memory cache is dropped to free them straight away.
+    """
+    global model_trainer, model_checked_at
+    now = time.monotonic()
+    if now - model_checked_at < MODEL_CHECK_INTERVAL:
+        return
+    model_checked_at = now
+    
+    latest = read_latest_version()
+    if latest is None or latest == model_trainer.metadata.get('artifact_version'):
+        return
+    with model_lock:
+        if latest == model_trainer.metadata.get('artifact_version'):
+            return
+        try:
+            trainer = load_inference_model()
+        except Exception as e:
+            log_event(logger, 'model_load_failed', logging.WARNING, artifact_version=latest, error=str(e))
+            increment('byteme_errors_total', stage='model_load')
+            return
+        if 'text_vectorizer' in trainer.extras:
+            get_feature_extractor().text_vectorizer = trainer.extras['text_vectorizer']
+        model_trainer = trainer
+        result_cache.clear()
+        log_event(logger, 'model_switched', artifact_version=trainer.metadata.get('artifact_version'))
 
-def download_tiktok_video(url, output_dir="temp_videos"):
-    """Download TikTok video using yt-dlp"""
+def get_similarity_index():
+    """Similarity index saved with the serving model, kept up to date with the dataset
+    
+    Reloaded whenever the model artifact changes. Videos added to the dataset
+    since the index was saved are indexed at most every SIMILARITY_SYNC_INTERVAL
+    seconds. None without a model, or for an artifact saved without an index.
+    """
+    global similarity_index, similarity_index_version, similarity_synced_at
+    trainer = get_model_trainer()
+    if trainer is None:
+        return None
+    
+    version = trainer.metadata.get('artifact_version')
+    with similarity_index_lock:
+        if similarity_index_version != version:
+            similarity_index = load_artifact_similarity_index(DEFAULT_ARTIFACT_DIR, trainer.metadata)
+            similarity_index_version = version
+            similarity_synced_at = 0
+        index = similarity_index
+        if index is None or time.monotonic() - similarity_synced_at < SIMILARITY_SYNC_INTERVAL:
+            return index
+        similarity_synced_at = time.monotonic()
+    
     try:
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Use yt-dlp to download the video
-        cmd = [
-            'yt-dlp',
-            '-f', 'b',  # Use 'b' instead of 'best' to suppress warning
-            '-o', os.path.join(output_dir, '%(title)s.%(ext)s'),
-            '--no-playlist',
-            '--quiet',  # Reduce output noise
-            url
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-        
-        if result.returncode != 0:
-            raise Exception(f"Download failed: {result.stderr}")
-        
-        # Find the downloaded file
-        files = os.listdir(output_dir)
-        if not files:
-            raise Exception("No video file found after download")
-        
-        # Get the most recent file
-        video_file = max([os.path.join(output_dir, f) for f in files], key=os.path.getctime)
-        return video_file
-        
+        with timed('similarity_sync'):
+            added = index.update_from(TikTokDataCollector(), get_feature_extractor(),
+                                      workers=BATCH_EXTRACT_WORKERS, use_threads=True)
+        if added:
+            log_event(logger, 'similarity_index_updated', added=added, size=len(index))
     except Exception as e:
+        # Serve the index as it is; the next sync tries again
+        log_event(logger, 'similarity_sync_failed', logging.WARNING, error=str(e))
+        increment('byteme_errors_total', stage='similarity_sync')
+    return index
+
+def preload(torch_threads=None):
+    """Load the model and warm up the extractor before serving (one call per worker)"""
+    if torch_threads:
+        # Keep worker processes from oversubscribing the CPU cores between them.
+        # torch is only imported if a retrain needs it, and reads these on import
+        os.environ['OMP_NUM_THREADS'] = str(torch_threads)
+        os.environ['MKL_NUM_THREADS'] = str(torch_threads)
+        if 'torch' in sys.modules:
+            sys.modules['torch'].set_num_threads(torch_threads)
+    # Only load a model that already exists: training here would hold up the
+    # worker past gunicorn's timeout and get it killed, over and over
+    if get_model_trainer(train_if_missing=False) is None:
+        log_event(logger, 'model_unavailable', logging.WARNING, message='no trained model artifact to preload')
+    extractor = get_feature_extractor()
+    if extractor.embedding_config is not None:
+        # Load the CNN now; this is also where torch's thread count gets capped
+        extractor.frame_embedder()
+
+def download_tiktok_video(url, output_dir=DOWNLOAD_DIR):
+    """Download TikTok video using yt-dlp
+    
+    Goes through the process-wide download manager: each URL has its own file,
+    so concurrent requests never pick up each other's videos, and a URL that is
+    already downloaded (or downloading) isn't fetched again.
+    """
+    try:
+        with timed('download'):
+            video_path, _ = get_download_manager(output_dir).download(url)
+        return video_path
+    except DownloadError as e:
+        increment('byteme_errors_total', stage='download')
         raise Exception(f"Failed to download video: {str(e)}")
 
 def analyze_video_with_ai(video_path, description=""):
     """Analyze video using the AI model"""
+    return score_video(video_path, description)[0]
+
+def score_video(video_path, description="", progress=None):
+    """Score a video, returning (scores, from_model)
+    
+    from_model is False when the heuristic fallback produced the scores, which
+    must not be cached as if the model had. progress(stage, value) is called as
+    the features of each modality and then the raw predictions are ready.
+    """
     try:
-        # Extract features
-        video_features = feature_extractor.extract_video_features(video_path)
-        audio_features = feature_extractor.extract_audio_features(video_path)
-        text_features = feature_extractor.extract_text_features(description)
+        # Load the saved model artifact (retrains only if missing or stale)
+        with timed('model_load'):
+            trainer = get_model_trainer()
+        if trainer is None:
+            log_event(logger, 'heuristic_fallback', logging.WARNING, reason='no_model')
+            increment('byteme_heuristic_fallbacks_total', reason='no_model')
+            # Use heuristic analysis instead
+            return analyze_video_with_heuristics(video_path, description), False
         
-        # Combine features
-        combined_features = np.concatenate([video_features, audio_features, text_features])
-        features_array = np.array([combined_features])
-        
-        # Load trained model if available
-        global model_trainer
-        if model_trainer is None:
-            # Try to load existing model
-            try:
-                model_trainer = TikTokModelTrainer()
-                # Check if we have a trained model
-                collector = TikTokDataCollector()
-                dataset = collector.get_dataset()
-                
-                if len(dataset) >= 2:
-                    # Extract features from training data
-                    train_features = []
-                    train_scores = []
-                    
-                    for _, row in dataset.iterrows():
-                        try:
-                            vf = feature_extractor.extract_video_features(row['video_path'])
-                            af = feature_extractor.extract_audio_features(row['video_path'])
-                            tf = feature_extractor.extract_text_features(row['description'])
-                            combined = np.concatenate([vf, af, tf])
-                            train_features.append(combined)
-                            train_scores.append([row['accuracy'], row['homogeneity'], row['comedy'], row['theatrism'], row['coherence']])
-                        except:
-                            continue
-                    
-                    if len(train_features) >= 2:
-                        X = np.array(train_features)
-                        y = np.array(train_scores)
-                        X_train, X_test, y_train, y_test = model_trainer.prepare_data(X, y)
-                        model_trainer.train(X_train, y_train, epochs=50)
-                        print("✅ Loaded and trained model from existing data")
-                    else:
-                        raise Exception("Not enough training data")
-                else:
-                    raise Exception("No training data available")
-                    
-            except Exception as e:
-                print(f"⚠️ Could not load trained model: {e}")
-                # Use heuristic analysis instead
-                return analyze_video_with_heuristics(video_path, description)
+        # Extract the combined video, audio and text features
+        features_array = get_feature_extractor().extract_all(video_path, description, progress).reshape(1, -1)
         
         # Make prediction
-        predictions = model_trainer.predict(features_array)
+        with timed('predict'):
+            predictions = trainer.predict(features_array)
         scores = predictions[0]
+        if progress is not None:
+            progress('predict', scores)
         
         # Apply realistic scoring adjustments
         scores = apply_realistic_scoring(scores, description)
         
-        return scores
+        return scores, True
         
+    except UndecodableVideoError:
+        # Not a video - the caller rejects it rather than scoring it at all
+        raise
     except Exception as e:
-        print(f"AI analysis failed: {e}")
+        log_event(logger, 'heuristic_fallback', logging.WARNING, reason='error', error=str(e))
+        increment('byteme_heuristic_fallbacks_total', reason='error')
+        increment('byteme_errors_total', stage='analysis')
         # Fallback to heuristic analysis
-        return analyze_video_with_heuristics(video_path, description)
+        return analyze_video_with_heuristics(video_path, description), False
+
+def analyze_videos_with_ai(video_paths, descriptions):
+    """Score many videos: concurrent feature extraction, then one batched forward pass
+    
+    Returns one entry per video: a list of scores, or an error string.
+    """
+    # Load the model first: it installs the fitted text vectorizer the features need
+    with timed('model_load'):
+        trainer = get_model_trainer()
+    X, failures = get_feature_extractor().extract_many(
+        video_paths, descriptions, workers=BATCH_EXTRACT_WORKERS, use_threads=True
+    )
+    
+    valid = [i for i in range(len(video_paths)) if i not in failures]
+    outcomes = [failures.get(i) for i in range(len(video_paths))]
+    if not valid:
+        return outcomes
+    
+    if trainer is None:
+        # No model - heuristic scores for every video we could read
+        log_event(logger, 'heuristic_fallback', logging.WARNING, reason='no_model', items=len(valid))
+        increment('byteme_heuristic_fallbacks_total', amount=len(valid), reason='no_model')
+        for i in valid:
+            outcomes[i] = analyze_video_with_heuristics(video_paths[i], descriptions[i])
+        return outcomes
+    
+    # One scaler transform and one model forward pass for the whole batch
+    try:
+        with timed('predict'):
+            predictions = trainer.predict(X)
+    except Exception as e:
+        # Same fallback as the single-video path, for every video in the batch
+        log_event(logger, 'heuristic_fallback', logging.WARNING, reason='error', error=str(e), items=len(valid))
+        increment('byteme_heuristic_fallbacks_total', amount=len(valid), reason='error')
+        increment('byteme_errors_total', stage='predict')
+        for i in valid:
+            outcomes[i] = analyze_video_with_heuristics(video_paths[i], descriptions[i])
+        return outcomes
+    for i, prediction in zip(valid, predictions):
+        outcomes[i] = apply_realistic_scoring(prediction, descriptions[i])
+    return outcomes
 
 def analyze_video_with_heuristics(video_path, description=""):
     """Fallback heuristic analysis"""
@@ -243,62 +415,411 @@ def serve_static(filename):
     """Serve static files"""
     return send_from_directory('static', filename)
 
+def build_analysis_result(url, description, scores):
+    """Turn model scores into the JSON result returned to clients"""
+    # Calculate average score
+    average_score = sum(scores) / len(scores)
+    
+    # Get reward tier
+    tier = get_reward_tier(average_score)
+    
+    # Generate advice
+    advice = get_improvement_advice(scores)
+    
+    # Prepare response - convert numpy types to Python types
+    return {
+        'url': url,
+        'description': description or 'TikTok video analysis',
+        'scores': {
+            'accuracy': float(round(scores[0], 1)),
+            'homogeneity': float(round(scores[1], 1)),
+            'comedy': float(round(scores[2], 1)),
+            'theatrism': float(round(scores[3], 1)),
+            'coherence': float(round(scores[4], 1))
+        },
+        'averageScore': float(round(average_score, 1)),
+        'tier': tier,
+        'advice': advice
+    }
+
+def run_analysis(url, description, progress=None):
+    """Full analysis of one request: locate the video, score it, build the result"""
+    # Instead of downloading, we point directly to a local file.
+    # We still receive the URL, but won't use it for download
+    if progress is not None:
+        progress('download', LOCAL_VIDEO_PATH)
+    return analyze_file(LOCAL_VIDEO_PATH, url, description, video_key(url) if url else None, progress=progress)
+
+def analyze_file(video_path, url, description, video_id=None, content_hash=None, progress=None):
+    """Score one video file and build the result, going through the result cache
+    
+    video_id identifies the video in the result cache (no caching without one).
+    content_hash is the file's SHA-256 if already known, so the feature cache
+    doesn't have to read the file again to key it. progress is passed on to
+    score_video. A file without a single decodable video frame raises
+    UndecodableVideoError instead of being scored (and cached) as blank frames.
+    """
+    # Repeat submissions of a video are answered from the result cache
+    with timed('model_load'):
+        trainer = get_model_trainer()
+    cache_key = None
+    if trainer is not None and video_id:
+        cache_key = result_cache_key(video_id, description, trainer.metadata.get('artifact_version'))
+        cached = result_cache.get(cache_key)
+        increment('byteme_result_cache_total', result='miss' if cached is None else 'hit')
+        if cached is not None:
+            # Same video under another URL or file name
+            return {**cached, 'url': url}
+    
+    if not os.path.exists(video_path):
+        raise FileNotFoundError('Local video file not found on server.')
+    
+    extractor = get_feature_extractor()
+    if content_hash and extractor.cache is not None:
+        extractor.cache.remember_content_hash(video_path, content_hash)
+    
+    # Analyze with AI
+    scores, from_model = score_video(video_path, description, progress)
+    result = build_analysis_result(url, description, scores)
+    if cache_key and from_model:
+        result_cache.put(cache_key, result)
+    return result
+
+def parse_analysis_request():
+    """Read url and description from the JSON request body"""
+    data = request.get_json(silent=True) or {}
+    url = data.get('url', '').strip()
+    description = data.get('description', '').strip()
+    return url, description
+
+def run_analysis_job(payload, progress=None):
+    """Job queue entry point: one analysis, logged with its stage timings"""
+    with request_scope(logger, 'analysis_job', url=payload['url']):
+        return run_analysis(payload['url'], payload['description'], progress)
+
+def get_job_queue():
+    """Create this process's job queue on first use"""
+    global job_queue
+    if job_queue is None:
+        with job_queue_lock:
+            if job_queue is None:
+                job_queue = JobQueue(
+                    run_analysis_job,
+                    max_workers=int(os.environ.get('BYTEME_JOB_WORKERS', 2)),
+                    max_pending=int(os.environ.get('BYTEME_MAX_PENDING_JOBS', 16))
+                )
+    return job_queue
+
+def shutdown():
+    """Finish running jobs before the process exits"""
+    if job_queue is not None:
+        job_queue.shutdown(wait=True)
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze_video():
     """API endpoint to analyze TikTok video"""
     try:
-        data = request.get_json()
-        url = data.get('url', '').strip() # We still receive the URL, but won't use it for download
-        description = data.get('description', '').strip()
-        
-        
-        # Instead of downloading, we point directly to a local file.
-        video_path = os.path.join(os.path.dirname(__file__), 'local_video.MP4')
-        
-        if not os.path.exists(video_path):
-            return jsonify({'error': 'Local video file not found on server.'}), 500
-            
-            
-        # Analyze with AI
-        scores = analyze_video_with_ai(video_path, description)
-            
-        # Calculate average score
-        average_score = sum(scores) / len(scores)
-            
-        # Get reward tier
-        tier = get_reward_tier(average_score)
-            
-         # Generate advice
-        advice = get_improvement_advice(scores)
-            
-        # Prepare response - convert numpy types to Python types
-        result = {
-                'url': url,
-                'description': description or 'TikTok video analysis',
-                'scores': {
-                    'accuracy': float(round(scores[0], 1)),
-                    'homogeneity': float(round(scores[1], 1)),
-                    'comedy': float(round(scores[2], 1)),
-                    'theatrism': float(round(scores[3], 1)),
-                    'coherence': float(round(scores[4], 1))
-                },
-                'averageScore': float(round(average_score, 1)),
-                'tier': tier,
-                'advice': advice
-            }
+        url, description = parse_analysis_request()
+        with request_scope(logger, 'analyze', url=url):
+            return jsonify(run_analysis(url, description))
+    
+    except UndecodableVideoError as e:
+        return jsonify({'error': str(e)}), 422
+    except Exception as e:
+        increment('byteme_errors_total', stage='request')
+        return jsonify({'error': str(e)}), 500
+
+def stream_stages():
+    """The stages this server's analyses report, in order"""
+    if get_feature_extractor().embedding_config is None:
+        return [stage for stage in STREAM_STAGES if stage != 'embedding']
+    return list(STREAM_STAGES)
+
+def sse_event(event, data):
+    """One server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, default=float)}\n\n"
+
+def stage_partial(stage, value):
+    """What a stage event tells the client about the result so far"""
+    if stage == 'video':
+        return {'brightness': round(float(value[0]), 1), 'motion': round(float(value[6]), 2),
+                'cutRate': round(float(value[8]), 3)}
+    if stage == 'audio':
+        return {'spectralCentroid': round(float(value[-1]), 1)}
+    if stage == 'predict':
+        # Raw model output, before the adjustments in the final result
+        names = ('accuracy', 'homogeneity', 'comedy', 'theatrism', 'coherence')
+        return {'scores': {name: round(float(score), 1) for name, score in zip(names, value)}}
+    return {}
+
+@app.route('/api/analyze/stream', methods=['POST'])
+def analyze_stream():
+    """Analyze like /api/analyze, streaming a server-sent event as each stage finishes
+    
+    Events: 'start' (the stages to expect), one 'stage' per finished stage with
+    its duration, the time since the request started and a partial result,
+    then 'result' or 'error'. Keep-alive comments go out while a stage runs,
+    so idle-connection timeouts don't cut off slow analyses.
+    
+    The analysis runs on the job queue, so streams share its bounded worker
+    pool and backlog limit with /api/jobs (503 when it is full).
+    """
+    url, description = parse_analysis_request()
+    events = queue.Queue()
+    start = time.perf_counter()
+    stage_start = start
+    
+    def progress(stage, value):
+        nonlocal stage_start
+        now = time.perf_counter()
+        events.put(('stage', {
+            'stage': stage,
+            'ms': round((now - stage_start) * 1000, 1),
+            'elapsedMs': round((now - start) * 1000, 1),
+            'partial': stage_partial(stage, value)
+        }))
+        stage_start = now
+    
+    def finished(job):
+        if job['status'] == 'done':
+            events.put(('result', {'result': job['result'],
+                                   'elapsedMs': round((time.perf_counter() - start) * 1000, 1)}))
+        else:
+            increment('byteme_errors_total', stage='request')
+            events.put(('error', {'error': job['error']}))
+    
+    jobs = get_job_queue()
+    try:
+        job = jobs.submit({'url': url, 'description': description}, progress=progress, on_finish=finished)
+    except QueueFullError as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = str(JOB_RETRY_AFTER_SECONDS)
+        return response, 503
+    
+    def stream():
+        done = False
+        try:
+            yield sse_event('start', {'stages': stream_stages(), 'jobId': job['id']})
+            while True:
+                try:
+                    event, data = events.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield sse_event(event, data)
+                if event in ('result', 'error'):
+                    done = True
+                    return
+        finally:
+            # Client went away: a job still waiting for a worker is dropped; one
+            # already running finishes and fills the result cache
+            if not done:
+                jobs.cancel(job['id'])
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/analyze/upload', methods=['POST'])
+def analyze_upload():
+    """Analyze a video file uploaded as multipart/form-data (field 'video', optional 'description')"""
+    # Refuse oversized uploads before receiving them when the client says how big they are
+    if request.content_length and request.content_length > MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD:
+        return jsonify({'error': f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"}), 413
+    
+    try:
+        with request_scope(logger, 'analyze_upload') as fields:
+            with timed('upload'):
+                upload = uploaded_video(request)
+            if upload is None:
+                return jsonify({'error': "Expected a video file in the 'video' field"}), 400
+            spooled, filename = upload
+            content_hash = spooled.content_hash()
+            fields.update({'upload_bytes': spooled.size, 'content_hash': content_hash})
             
-        return jsonify(result)
+            description = request.form.get('description', '').strip()
+            # Identical files share result and feature cache entries, whatever they're called
+            result = analyze_file(spooled.path, filename, description,
+                                  video_id=f"sha256-{content_hash}", content_hash=content_hash)
+            return jsonify(result)
+    
+    except RequestEntityTooLarge as e:
+        increment('byteme_errors_total', stage='upload')
+        return jsonify({'error': e.description}), 413
+    except UndecodableVideoError as e:
+        increment('byteme_errors_total', stage='upload')
+        return jsonify({'error': str(e)}), 422
+    except Exception as e:
+        increment('byteme_errors_total', stage='request')
+        return jsonify({'error': str(e)}), 500
+
+def resolve_batch_video(item):
+    """Local path (inside MEDIA_ROOT) or downloaded file for one batch item"""
+    if item.get('path'):
+        path = os.path.realpath(item['path'])
+        if os.path.commonpath([path, os.path.realpath(MEDIA_ROOT)]) != os.path.realpath(MEDIA_ROOT):
+            raise ValueError(f"Path must be inside {MEDIA_ROOT}")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Video not found: {item['path']}")
+        return path
+    if item.get('url'):
+        return download_tiktok_video(item['url'])
+    raise ValueError("Each item needs a 'url' or a 'path'")
+
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Score many videos in one request with a single batched model pass"""
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': "Expected a non-empty 'items' list"}), 400
+    if len(items) > MAX_BATCH_ITEMS:
+        return jsonify({'error': f"At most {MAX_BATCH_ITEMS} items per batch"}), 400
+    
+    results = [None] * len(items)
+    
+    # Resolve (download) all videos concurrently
+    def resolve(index):
+        item = items[index]
+        if not isinstance(item, dict):
+            raise ValueError("Each item must be an object")
+        return resolve_batch_video(item)
+    
+    video_paths = {}
+    with ThreadPoolExecutor(max_workers=BATCH_DOWNLOAD_WORKERS) as executor:
+        futures = {index: executor.submit(resolve, index) for index in range(len(items))}
+        for index, future in futures.items():
+            try:
+                video_paths[index] = future.result()
+            except Exception as e:
+                results[index] = {'index': index, 'error': str(e)}
+    
+    # Extract and score everything that resolved in one go
+    indices = sorted(video_paths)
+    descriptions = [str(items[i].get('description', '')).strip() for i in indices]
+    with request_scope(logger, 'analyze_batch', items=len(items), resolved=len(indices)):
+        outcomes = analyze_videos_with_ai([video_paths[i] for i in indices], descriptions)
+    
+    for index, description, outcome in zip(indices, descriptions, outcomes):
+        if isinstance(outcome, str):
+            results[index] = {'index': index, 'error': outcome}
+        else:
+            url = items[index].get('url') or items[index].get('path')
+            results[index] = {'index': index, 'result': build_analysis_result(url, description, outcome)}
+    
+    return jsonify({
+        'results': results,
+        'count': len(results),
+        'failed': sum(1 for r in results if 'error' in r)
+    })
+
+def similar_response(index, neighbours):
+    """Public view of a similarity search"""
+    top = neighbours[0] if neighbours else None
+    return {
+        'neighbours': [{
+            'id': neighbour['id'],
+            'videoName': neighbour['video_name'],
+            'similarity': round(neighbour['similarity'], 4),
+            'scores': {name: round(value, 1) for name, value in neighbour['scores'].items()},
+            'averageScore': round(sum(neighbour['scores'].values()) / len(neighbour['scores']), 1)
+        } for neighbour in neighbours],
+        # A near-identical dataset video - most likely a resubmission
+        'duplicateOf': top['id'] if top and top['similarity'] >= DUPLICATE_SIMILARITY else None,
+        'indexSize': len(index),
+        'mode': index.mode
+    }
+
+@app.route('/api/similar', methods=['POST'])
+def find_similar():
+    """Most similar dataset videos, with how they were scored
+    
+    The query is a dataset video by its row 'id', or any video by 'url' or
+    'path' (inside MEDIA_ROOT) with an optional 'description'. 'k' neighbours
+    are returned (default 5).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        k = int(data.get('k', 5))
+    except (TypeError, ValueError):
+        return jsonify({'error': "'k' must be a number"}), 400
+    if not 1 <= k <= MAX_SIMILAR:
+        return jsonify({'error': f"'k' must be between 1 and {MAX_SIMILAR}"}), 400
+    
+    try:
+        with request_scope(logger, 'similar', k=k) as fields:
+            index = get_similarity_index()
+            if index is None:
+                return jsonify({'error': 'No similarity index - train the model to build one'}), 503
             
+            if data.get('id') is not None:
+                try:
+                    with timed('similarity_search'):
+                        neighbours = index.neighbours_of(int(data['id']), k)
+                except KeyError as e:
+                    return jsonify({'error': e.args[0]}), 404
+            else:
+                video_path = resolve_batch_video(data)
+                description = str(data.get('description', '')).strip()
+                features = get_feature_extractor().extract_all(video_path, description)
+                with timed('similarity_search'):
+                    neighbours = index.search(features, k)
+            fields['neighbours'] = len(neighbours)
+            return jsonify(similar_response(index, neighbours))
+    
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"Analysis error: {e}")
+        increment('byteme_errors_total', stage='request')
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Queue an analysis and return its job id straight away"""
+    url, description = parse_analysis_request()
+    
+    try:
+        job = get_job_queue().submit({'url': url, 'description': description})
+    except QueueFullError as e:
+        # Backpressure: tell the client to come back later instead of piling up
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = str(JOB_RETRY_AFTER_SECONDS)
+        return response, 503
+    
+    response = jsonify(job_response(job))
+    response.headers['Location'] = f"/api/jobs/{job['id']}"
+    return response, 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status of a queued analysis, with the result once it's done"""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_response(job))
+
+def job_response(job):
+    """Public view of a job record"""
+    return {
+        'jobId': job['id'],
+        'status': job['status'],
+        'result': job['result'],
+        'error': job['error'],
+        'createdAt': job['createdAt'],
+        'updatedAt': job['updatedAt']
+    }
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Stage latencies and counters of this worker process, in Prometheus text format"""
+    return Response(registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({'status': 'healthy', 'message': 'BYTEME AI Analyzer is running'})
 
 if __name__ == '__main__':
+    # Development server only - use serve.py for concurrent production serving
     print("🚀 Starting BYTEME Web Server...")
     print("📱 Open http://localhost:8080 in your browser")
     print("🔗 API available at http://localhost:8080/api/analyze")
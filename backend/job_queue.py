@@ -0,0 +1,160 @@
+"""
+Background job queue for long-running video analyses
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+class QueueFullError(Exception):
+    """Raised when too many jobs are already waiting to run"""
+
+class JobStore:
+    """Job records as JSON files, so every server worker process sees every job"""
+    
+    def __init__(self, store_dir=os.path.join("data", "jobs"), result_ttl=3600):
+        self.store_dir = store_dir
+        self.result_ttl = result_ttl
+        os.makedirs(store_dir, exist_ok=True)
+    
+    def _path(self, job_id):
+        return os.path.join(self.store_dir, f"{job_id}.json")
+    
+    def save(self, job):
+        """Write a job record atomically"""
+        path = self._path(job['id'])
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+    
+    def load(self, job_id):
+        """Read a job record, or None if the id is unknown or malformed"""
+        if not JOB_ID_PATTERN.fullmatch(job_id):
+            return None
+        try:
+            with open(self._path(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def cleanup(self):
+        """Delete job records older than the result TTL"""
+        cutoff = time.time() - self.result_ttl
+        for name in os.listdir(self.store_dir):
+            path = os.path.join(self.store_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                continue
+
+class JobQueue:
+    """Runs jobs on a bounded thread pool, rejecting new ones once the backlog is full"""
+    
+    def __init__(self, run_job, max_workers=2, max_pending=16, store=None, cleanup_interval=60):
+        self.run_job = run_job
+        self.max_pending = max_pending
+        self.store = store or JobStore()
+        self.cleanup_interval = cleanup_interval
+        
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._queued = {}
+        self._last_cleanup = 0
+        self._closed = False
+    
+    def submit(self, payload, progress=None, on_finish=None):
+        """Queue a job and return its record straight away
+        
+        progress is passed on to run_job, and on_finish(job) is called with the
+        final record once the job is done or failed. Both run in the worker
+        thread and, unlike the payload, aren't stored with the job.
+        """
+        with self._lock:
+            if self._closed:
+                raise QueueFullError("Server is shutting down")
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"Too many jobs in progress ({self.max_pending})")
+            self._pending += 1
+        
+        now = time.time()
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': 'queued',
+            'payload': payload,
+            'result': None,
+            'error': None,
+            'createdAt': now,
+            'updatedAt': now
+        }
+        self.store.save(job)
+        with self._lock:
+            self._queued[job['id']] = job
+        self._executor.submit(self._run, job, progress, on_finish)
+        
+        self._cleanup_if_due(now)
+        # Snapshot - the worker thread may already be updating the record
+        return dict(job)
+    
+    def get(self, job_id):
+        """Current record of a job, or None"""
+        return self.store.load(job_id)
+    
+    def cancel(self, job_id):
+        """Drop a job that hasn't started yet; False if it is already running or over"""
+        with self._lock:
+            job = self._queued.pop(job_id, None)
+            if job is None:
+                return False
+            self._pending -= 1
+        self._update(job, status='cancelled', error="Cancelled before the job started")
+        return True
+    
+    def _run(self, job, progress=None, on_finish=None):
+        with self._lock:
+            if self._queued.pop(job['id'], None) is None:
+                # Cancelled while it waited
+                return
+        try:
+            self._update(job, status='running')
+            result = self.run_job(job['payload'], progress)
+            self._update(job, status='done', result=result)
+        except Exception as e:
+            self._update(job, status='failed', error=str(e))
+        finally:
+            with self._lock:
+                self._pending -= 1
+        if on_finish is not None:
+            on_finish(job)
+    
+    def _update(self, job, **changes):
+        job.update(changes, updatedAt=time.time())
+        self.store.save(job)
+    
+    def _cleanup_if_due(self, now):
+        with self._lock:
+            if now - self._last_cleanup < self.cleanup_interval:
+                return
+            self._last_cleanup = now
+        self.store.cleanup()
+    
+    def shutdown(self, wait=True):
+        """Stop accepting jobs and let the running ones finish"""
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        
+        # Jobs that never started won't run now - don't leave clients polling forever
+        with self._lock:
+            abandoned = list(self._queued.values())
+            self._queued.clear()
+        for job in abandoned:
+            self._update(job, status='failed', error="Server shut down before the job started")
@@ -0,0 +1,139 @@
+"""
+Cache of finished analysis results, so repeated submissions of a video skip the pipeline
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+def result_cache_key(video_key, description, artifact_version):
+    """Cache key of one analysis: which video, which description, which model"""
+    description_hash = hashlib.sha256((description or "").encode()).hexdigest()[:16]
+    return f"{video_key}:{description_hash}:{artifact_version}"
+
+class ResultCache:
+    """LRU of analysis results with a TTL, optionally backed by a directory on disk
+
+    The in-memory tier is an OrderedDict guarded by a lock, so a hit costs a few
+    microseconds. With disk_dir set, results are also written there as JSON and
+    survive restarts (and are shared between server workers); a memory miss
+    falls through to disk and promotes the entry.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600, disk_dir=None, disk_max_entries=10000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_entries = disk_max_entries
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_puts = 0
+        self.hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key):
+        """Cached result for key, or None if missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+                del self._entries[key]
+
+        entry = self._disk_get(key, now)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, entry)
+        return entry[1]
+
+    def put(self, key, result):
+        """Cache a result for ttl seconds"""
+        entry = (time.time() + self.ttl, result)
+        with self._lock:
+            self._store(key, entry)
+        self._disk_put(key, entry)
+
+    def clear(self):
+        """Drop the in-memory entries, e.g. after a new model artifact is deployed
+
+        Disk entries are keyed by artifact version too, so they simply stop
+        matching and age out through the TTL and the disk size bound.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, hashlib.sha256(key.encode()).hexdigest() + '.json')
+
+    def _disk_get(self, key, now):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if record.get('key') != key or record.get('expires_at', 0) <= now:
+            return None
+        return record['expires_at'], record['result']
+
+    def _disk_put(self, key, entry):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'key': key, 'expires_at': entry[0], 'result': entry[1]}, f)
+        os.replace(tmp_path, path)
+
+        # Listing the directory is slow - only check the size bound every so often
+        self._disk_puts += 1
+        if self._disk_puts % 64 == 0:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Remove expired entries, then the least recently written beyond disk_max_entries"""
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            if mtime + self.ttl < now:
+                self._remove(path)
+            else:
+                entries.append((mtime, path))
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.disk_max_entries)]:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
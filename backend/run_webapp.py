@@ -11,6 +11,18 @@ import subprocess
 def main():
     """Launch the BYTEME web application"""
     
+    # --production runs the multi-worker gunicorn server instead of the dev server
+    if '--production' in sys.argv[1:]:
+        serve_args = [arg for arg in sys.argv[1:] if arg != '--production']
+        serve_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serve.py')
+        try:
+            subprocess.run([sys.executable, serve_script] + serve_args, check=True)
+        except KeyboardInterrupt:
+            print("\n👋 Web app stopped by user")
+        except subprocess.CalledProcessError as e:
+            print(f"❌ Error starting web app: {e}")
+        return
+    
     # Change to webapp directory
     webapp_dir = os.path.join(os.path.dirname(__file__), 'webapp')
     
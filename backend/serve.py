@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+BYTEME Production Server
+Serves the analyze API with gunicorn: several worker processes, each with a
+pool of request threads and its own preloaded model and feature extractor
+"""
+
+import os
+import sys
+import argparse
+import multiprocessing
+from gunicorn.app.base import BaseApplication
+
+# Make app.py and the src modules importable regardless of how we're launched
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.append(os.path.join(BACKEND_DIR, '..', 'src'))
+
+class BytemeServer(BaseApplication):
+    """Gunicorn application wrapper around the Flask app"""
+    
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+    
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+    
+    def load(self):
+        from app import app
+        return app
+
+def post_worker_init(worker):
+    """Preload the model in each worker before it accepts requests"""
+    from app import preload
+    
+    # Share the cores between workers instead of every worker using all of them
+    torch_threads = max(1, multiprocessing.cpu_count() // worker.cfg.workers)
+    preload(torch_threads=torch_threads)
+    print(f"✅ Worker {worker.pid} ready")
+
+def worker_exit(server, worker):
+    """Runs after a worker has finished its in-flight requests"""
+    from app import shutdown
+    
+    # Let background analysis jobs finish too
+    shutdown()
+    print(f"👋 Worker {worker.pid} stopped")
+
+def main():
+    """Parse options and start the production server"""
+    
+    parser = argparse.ArgumentParser(description="Run the BYTEME API under gunicorn")
+    parser.add_argument('--bind', default=os.environ.get('BYTEME_BIND', '0.0.0.0:8080'))
+    parser.add_argument('--workers', type=int,
+                        default=int(os.environ.get('BYTEME_WORKERS', multiprocessing.cpu_count())))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('BYTEME_THREADS', 4)))
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('BYTEME_TIMEOUT', 180)),
+                        help="Seconds before a silent worker is restarted (analyses can be slow)")
+    parser.add_argument('--graceful-timeout', type=int, default=int(os.environ.get('BYTEME_GRACEFUL_TIMEOUT', 60)),
+                        help="Seconds in-flight requests get to finish on shutdown")
+    args = parser.parse_args()
+    
+    options = {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        # Load the app in each worker, not the master, so torch state is never forked
+        'preload_app': False,
+        'post_worker_init': post_worker_init,
+        'worker_exit': worker_exit,
+        'accesslog': '-'
+    }
+    
+    print("🚀 Starting BYTEME Production Server...")
+    print(f"⚙️  {args.workers} workers x {args.threads} threads on {args.bind}")
+    
+    BytemeServer(options).run()
+
+if __name__ == "__main__":
+    main()
@@ -5,72 +5,75 @@ TikTok AI Model Trainer - Add training data and train your model
 
 import sys
 import os
+from contextlib import contextmanager
 sys.path.append('src')
-from data_collector import TikTokDataCollector
+from data_collector import TikTokDataCollector, SCORE_COLUMNS
 from simple_tiktok_downloader import add_tiktok_video_to_dataset
-from simple_model import TikTokModelTrainer
-import numpy as np
-import torch
+from model_artifacts import DEFAULT_ARTIFACT_DIR, artifact_is_stale, read_artifact_metadata, load_artifact_extras
+from inference import load_inference_model
+from feature_dataset import (DEFAULT_DATASET_DIR, compile_dataset, dataset_is_stale, load_compiled_dataset,
+                             sample_compiled_rows)
+from similarity_index import SimilarityIndex, follow_collector, load_artifact_similarity_index, similarity_index_path
 
-def train_ai_model():
-    """Train the AI model with current dataset"""
+# Fine-tuning replays previously trained videos alongside the new ones, so the
+# model doesn't drift towards the latest batch: this many old rows per new row,
+# but at least REPLAY_MIN_ROWS. A fifth of them go into the validation set
+REPLAY_ROWS_PER_NEW_ROW = 1
+REPLAY_MIN_ROWS = 64
+REPLAY_VALIDATION_FRACTION = 0.2
+
+def train_ai_model(epochs=100, artifact_dir=DEFAULT_ARTIFACT_DIR, workers=None, extractor=None,
+                   dataset_dir=DEFAULT_DATASET_DIR):
+    """Train the AI model with current dataset and save it as an artifact"""
     
     print("🚀 Training AI model...")
     
     try:
         # Load dataset
         collector = TikTokDataCollector()
-        dataset = collector.get_dataset()
+        descriptions = [row['description'] for row in collector.iter_videos()]
         
-        if len(dataset) < 2:
+        if len(descriptions) < 2:
             print("⚠️  Need at least 2 videos to train. Add more videos first.")
             return False
         
-        print(f"📊 Found {len(dataset)} videos in dataset")
+        print(f"📊 Found {len(descriptions)} videos in dataset")
         
-        # Extract features and scores
-        from feature_extractor import TikTokFeatureExtractor
-        extractor = TikTokFeatureExtractor()
+        # Heavy modules (torch, sklearn, cv2) are only imported once training runs
+        from feature_extractor import TikTokFeatureExtractor, FEATURE_SCHEMA_VERSION
+        from simple_model import TikTokModelTrainer
+        extractor = extractor or TikTokFeatureExtractor()
         
-        features = []
-        scores = []
+        # Fit the text vocabulary once over all training descriptions
+        extractor.fit_text_vectorizer(descriptions)
         
-        for _, row in dataset.iterrows():
-            try:
-                # Extract features for each video
-                video_features = extractor.extract_video_features(row['video_path'])
-                audio_features = extractor.extract_audio_features(row['video_path'])
-                text_features = extractor.extract_text_features(row['description'])
-                
-                # Combine features
-                combined_features = np.concatenate([video_features, audio_features, text_features])
-                features.append(combined_features)
-                
-                # Get scores
-                video_scores = [row['accuracy'], row['homogeneity'], row['comedy'], row['theatrism'], row['coherence']]
-                scores.append(video_scores)
-                
-            except Exception as e:
-                print(f"⚠️  Skipping video due to error: {e}")
-                continue
+        # Compile features into memory-mapped arrays, unless an up to date compile exists
+        if dataset_is_stale(dataset_dir, collector.fingerprint(), FEATURE_SCHEMA_VERSION, extractor.feature_config()):
+            print("📦 Compiling feature dataset...")
+            manifest = compile_dataset(collector, extractor, dataset_dir,
+                                       feature_schema_version=FEATURE_SCHEMA_VERSION, workers=workers)
+            for row_id, error in manifest['failures'].items():
+                print(f"⚠️  Skipping video {row_id}: {error}")
+        else:
+            print("📦 Using compiled feature dataset")
         
-        if len(features) < 2:
+        X, y, manifest = load_compiled_dataset(dataset_dir)
+        last_row_id = manifest['last_row_id']
+        
+        if len(X) < 2:
             print("⚠️  Not enough valid videos to train. Add more videos first.")
             return False
         
-        # Convert to numpy arrays
-        X = np.array(features)
-        y = np.array(scores)
-        
         print(f"✅ Extracted features shape: {X.shape}")
         print(f"✅ Scores shape: {y.shape}")
         
         # Train model
         trainer = TikTokModelTrainer()
-        X_train, X_test, y_train, y_test = trainer.prepare_data(X, y)
+        # Compiled rows are stored shuffled, so the split is two zero-copy slices
+        X_train, X_test, y_train, y_test = trainer.prepare_data(X, y, shuffle=False)
         
         print("🚀 Training model...")
-        trainer.train(X_train, y_train, epochs=100)
+        trainer.train(X_train, y_train, epochs=epochs, X_val=X_test, y_val=y_test)
         
         # Evaluate model
         print("📈 Evaluating model...")
@@ -80,6 +83,31 @@ def train_ai_model():
         for metric_name, metric_values in metrics.items():
             print(f"{metric_name}: MSE={metric_values['mse']:.4f}, MAE={metric_values['mae']:.4f}")
         
+        # Index every compiled video for similarity search - the features are already here
+        similarity_index = SimilarityIndex.build(X, manifest['row_ids'], manifest['video_names'], y,
+                                                 last_row_id=last_row_id)
+        print(f"🔎 Indexed {len(similarity_index)} videos for similarity search ({similarity_index.mode})")
+        
+        # Save the trained model so inference doesn't have to retrain
+        artifact_path = trainer.save(
+            artifact_dir,
+            feature_schema_version=FEATURE_SCHEMA_VERSION,
+            feature_config=extractor.feature_config(),
+            extras={'text_vectorizer': extractor.text_vectorizer},
+            similarity_index=similarity_index,
+            metadata={
+                'dataset_fingerprint': manifest['dataset_fingerprint'],
+                'last_row_id': last_row_id,
+                'n_samples': len(X),
+                'epochs': epochs,
+                'epochs_run': len(trainer.history),
+                'best_epoch': trainer.best_epoch,
+                'incremental_updates': 0,
+                'metrics': metrics
+            }
+        )
+        print(f"💾 Saved model artifact: {artifact_path}")
+        
         print("🎉 Model training complete!")
         print("You can now use ai_analyzer.py to analyze new videos!")
         
@@ -89,6 +117,196 @@ def train_ai_model():
         print(f"❌ Training failed: {e}")
         return False
 
+def update_ai_model(epochs=20, artifact_dir=DEFAULT_ARTIFACT_DIR, workers=None, extractor=None,
+                    dataset_dir=DEFAULT_DATASET_DIR):
+    """Fine-tune the saved model on videos added since it was trained
+    
+    Only the new rows have features extracted; the scaler statistics are updated
+    incrementally and training warm-starts from the saved weights. A random
+    sample of the compiled dataset is replayed in both the training and the
+    validation set. Falls back to a full train_ai_model run when there is no
+    compatible artifact.
+    """
+    
+    import numpy as np
+    import pandas as pd
+    from feature_extractor import TikTokFeatureExtractor, FEATURE_SCHEMA_VERSION
+    from simple_model import TikTokModelTrainer
+    extractor = extractor or TikTokFeatureExtractor()
+    
+    metadata = read_artifact_metadata(artifact_dir)
+    if (metadata is None or 'last_row_id' not in metadata
+            or artifact_is_stale(artifact_dir, FEATURE_SCHEMA_VERSION, feature_config=extractor.feature_config())):
+        print("🔄 No compatible model artifact - running full training...")
+        return train_ai_model(artifact_dir=artifact_dir, workers=workers, extractor=extractor, dataset_dir=dataset_dir)
+    
+    print("🚀 Updating AI model with new videos...")
+    
+    try:
+        collector = TikTokDataCollector()
+        new_rows = pd.DataFrame(collector.iter_videos(after_id=metadata['last_row_id']))
+        
+        if len(new_rows) == 0:
+            if metadata.get('dataset_fingerprint') == collector.fingerprint(up_to_id=metadata['last_row_id']):
+                print("✅ Model is already up to date")
+                return True
+            # Rows were removed, not added - nothing to train on, but record the
+            # dataset as it is now so the model isn't seen as stale on every load
+            print("📊 No new videos, but the dataset changed - updating the artifact metadata")
+        else:
+            print(f"📊 Found {len(new_rows)} new videos since the last training run")
+        
+        # The saved vocabulary stays fixed - refitting it would change the feature layout
+        trainer = TikTokModelTrainer.load(artifact_dir)
+        if 'text_vectorizer' in trainer.extras:
+            extractor.text_vectorizer = trainer.extras['text_vectorizer']
+        
+        # Extract features for the new videos only
+        X, failures = np.empty((0, 0)), {}
+        if len(new_rows) > 0:
+            X, failures = extractor.extract_many(new_rows['video_path'], new_rows['description'], workers=workers)
+        
+        for index, error in failures.items():
+            print(f"⚠️  Skipping video {new_rows.iloc[index]['video_name']}: {error}")
+        
+        replay_rows = 0
+        if len(X) > 0:
+            valid_rows = new_rows.drop(new_rows.index[list(failures)])
+            y = valid_rows[SCORE_COLUMNS].to_numpy(dtype=float)
+            
+            # Update scaler statistics with the new rows only - the replayed ones
+            # are already part of them - and fine-tune from the previous weights
+            X_train, X_test, y_train, y_test = trainer.prepare_data(X, y, incremental=True)
+            
+            replay = sample_compiled_rows(dataset_dir, max(REPLAY_MIN_ROWS, REPLAY_ROWS_PER_NEW_ROW * len(X)),
+                                          FEATURE_SCHEMA_VERSION, extractor.feature_config())
+            if replay is not None:
+                X_old, y_old = replay
+                replay_rows = len(X_old)
+                n_val = int(np.ceil(replay_rows * REPLAY_VALIDATION_FRACTION))
+                X_train = np.concatenate([X_train, X_old[n_val:]])
+                y_train = np.concatenate([y_train, y_old[n_val:]])
+                X_test = np.concatenate([X_test, X_old[:n_val]])
+                y_test = np.concatenate([y_test, y_old[:n_val]])
+                print(f"🔁 Replaying {replay_rows} previously trained videos")
+            
+            print("🚀 Fine-tuning model...")
+            trainer.train(X_train, y_train, epochs=epochs, warm_start=True, lr=0.0005, X_val=X_test, y_val=y_test)
+        
+        # Record the new rows as seen even if none of them could be used
+        last_row_id = max(int(new_rows['id'].max()) if len(new_rows) > 0 else 0, metadata['last_row_id'])
+        
+        # Carry the similarity index over with the new videos added to it - unless
+        # it already has them (videos added through indexing_collector)
+        similarity_index = load_artifact_similarity_index(artifact_dir, metadata)
+        if similarity_index is not None:
+            if len(X) > 0:
+                unseen = (valid_rows['id'] > similarity_index.last_row_id).to_numpy()
+                if unseen.any():
+                    unseen_rows = valid_rows[unseen]
+                    similarity_index.add(X[unseen], unseen_rows['id'].to_numpy(), unseen_rows['video_name'].tolist(), y[unseen])
+                    print(f"🔎 Added {len(unseen_rows)} videos to the similarity index")
+            similarity_index.last_row_id = max(similarity_index.last_row_id, last_row_id)
+        
+        artifact_path = trainer.save(
+            artifact_dir,
+            feature_schema_version=FEATURE_SCHEMA_VERSION,
+            feature_config=extractor.feature_config(),
+            extras=trainer.extras,
+            similarity_index=similarity_index,
+            metadata={
+                'dataset_fingerprint': collector.fingerprint(up_to_id=last_row_id),
+                'last_row_id': last_row_id,
+                'n_samples': metadata.get('n_samples', 0) + len(X),
+                'replay_rows': replay_rows,
+                'epochs': metadata.get('epochs'),
+                'incremental_updates': metadata.get('incremental_updates', 0) + 1,
+                'base_artifact_version': metadata['artifact_version']
+            }
+        )
+        print(f"💾 Saved model artifact: {artifact_path}")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Update failed: {e}")
+        return False
+
+@contextmanager
+def artifact_lock(artifact_dir=DEFAULT_ARTIFACT_DIR):
+    """Inter-process lock around checking and rebuilding the model artifact"""
+    
+    try:
+        import fcntl
+    except ImportError:
+        # No flock on this platform - fall back to no locking
+        yield
+        return
+    
+    os.makedirs(artifact_dir, exist_ok=True)
+    with open(os.path.join(artifact_dir, '.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def load_or_train_model(artifact_dir=DEFAULT_ARTIFACT_DIR, extractor=None, train_if_missing=True):
+    """Load the saved model for inference, retraining only if the artifact is missing or stale
+    
+    The fitted text vectorizer saved with the model is installed into extractor,
+    so its text features line up with what the model was trained on. With
+    train_if_missing=False nothing is trained: a usable artifact is loaded as it
+    is (even if newer videos exist) and None is returned when there is none.
+    """
+    
+    from feature_extractor import TikTokFeatureExtractor, FEATURE_SCHEMA_VERSION
+    
+    extractor = extractor or TikTokFeatureExtractor()
+    collector = TikTokDataCollector()
+    
+    # Several server workers may start at once - only one of them should retrain
+    with artifact_lock(artifact_dir):
+        if artifact_is_stale(artifact_dir, FEATURE_SCHEMA_VERSION, feature_config=extractor.feature_config()):
+            if not train_if_missing:
+                print("⚠️  Model artifact missing or stale - not training it here")
+                return None
+            print("🔄 Model artifact missing or stale - retraining...")
+            if not train_ai_model(artifact_dir=artifact_dir, extractor=extractor):
+                return None
+        elif train_if_missing and artifact_is_stale(artifact_dir, dataset_fingerprint=collector.fingerprint()):
+            # Same feature layout, new videos - fine-tune instead of retraining
+            print("🔄 New videos since the model was trained - updating...")
+            if not update_ai_model(artifact_dir=artifact_dir, extractor=extractor):
+                return None
+        
+        # Serve through the compiled inference engine rather than eager PyTorch
+        model = load_inference_model(artifact_dir)
+    if 'text_vectorizer' in model.extras:
+        extractor.text_vectorizer = model.extras['text_vectorizer']
+    return model
+
+def indexing_collector(artifact_dir=DEFAULT_ARTIFACT_DIR):
+    """Dataset collector that adds new videos to the saved similarity index as they come in
+    
+    A plain collector when the artifact has no index or its features no longer
+    match the extractor's (the next training run rebuilds the index anyway).
+    """
+    collector = TikTokDataCollector()
+    metadata = read_artifact_metadata(artifact_dir)
+    path = similarity_index_path(artifact_dir, metadata) if metadata else None
+    if path is None or not os.path.exists(path):
+        return collector
+    
+    from feature_extractor import TikTokFeatureExtractor, FEATURE_SCHEMA_VERSION
+    extractor = TikTokFeatureExtractor()
+    if artifact_is_stale(artifact_dir, FEATURE_SCHEMA_VERSION, feature_config=extractor.feature_config()):
+        return collector
+    # Text features must use the vocabulary the index was built with
+    extras = load_artifact_extras(artifact_dir, metadata)
+    if 'text_vectorizer' in extras:
+        extractor.text_vectorizer = extras['text_vectorizer']
+    return follow_collector(SimilarityIndex.load(path), collector, extractor, path)
+
 def add_single_video():
     """Add a single video with manual rating"""
     
@@ -157,7 +375,7 @@ def add_single_video():
     
     # Download and add to dataset
     print(f"\n📱 Downloading and adding video...")
-    success = add_tiktok_video_to_dataset(url, scores, description)
+    success = add_tiktok_video_to_dataset(url, scores, description, collector=indexing_collector())
     
     if success:
         print(f"✅ Successfully added: {description}")
@@ -251,9 +469,10 @@ def main():
         print("2. Add multiple videos with manual ratings")
         print("3. View current dataset")
         print("4. Train AI model")
-        print("5. Exit")
+        print("5. Update AI model with new videos")
+        print("6. Exit")
         
-        choice = input("\nEnter choice (1-5): ").strip()
+        choice = input("\nEnter choice (1-6): ").strip()
         
         if choice == '1':
             add_single_video()
@@ -268,6 +487,9 @@ def main():
             train_ai_model()
                 
         elif choice == '5':
+            update_ai_model()
+                
+        elif choice == '6':
             print("👋 Goodbye!")
             break
             
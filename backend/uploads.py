@@ -0,0 +1,75 @@
+"""
+Streaming video uploads - spooled straight to disk and hashed on the way in
+"""
+
+import os
+import hashlib
+import tempfile
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+DEFAULT_UPLOAD_DIR = os.path.join("data", "uploads")
+MAX_UPLOAD_BYTES = int(os.environ.get('BYTEME_MAX_UPLOAD_MB', 200)) * 1024 * 1024
+
+UPLOAD_EXTENSIONS = ('.mp4', '.webm', '.mkv', '.mov')
+
+class HashingUploadFile:
+    """Temporary file on disk that hashes and counts everything written to it
+
+    The multipart parser writes each chunk of the upload here as it arrives,
+    so memory use doesn't grow with the file and the SHA-256 is ready the
+    moment the upload finishes. The file is removed when it is closed, which
+    Flask does at the end of the request.
+    """
+
+    def __init__(self, upload_dir=DEFAULT_UPLOAD_DIR, suffix='.mp4', max_bytes=MAX_UPLOAD_BYTES):
+        os.makedirs(upload_dir, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(dir=upload_dir, prefix='upload-', suffix=suffix)
+        self._digest = hashlib.sha256()
+        self.max_bytes = max_bytes
+        self.size = 0
+
+    @property
+    def path(self):
+        return self._file.name
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise RequestEntityTooLarge(f"Upload exceeds {self.max_bytes // (1024 * 1024)} MB")
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def content_hash(self):
+        """SHA-256 of the bytes written so far"""
+        return self._digest.hexdigest()
+
+    def __getattr__(self, name):
+        # read/seek/flush/close/... go to the underlying file
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+class HashingRequest(Request):
+    """Request whose file uploads are spooled through HashingUploadFile"""
+
+    upload_dir = DEFAULT_UPLOAD_DIR
+    max_upload_bytes = MAX_UPLOAD_BYTES
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        extension = os.path.splitext(filename or '')[1].lower()
+        if extension not in UPLOAD_EXTENSIONS:
+            extension = '.mp4'
+        return HashingUploadFile(self.upload_dir, extension, self.max_upload_bytes)
+
+def uploaded_video(request, field='video'):
+    """(spooled file, original filename) of the video uploaded in field, None if there is none
+
+    The file is flushed so other processes (ffmpeg, OpenCV) see all of it.
+    """
+    upload = request.files.get(field)
+    if upload is None or not isinstance(upload.stream, HashingUploadFile):
+        return None
+    upload.stream.flush()
+    return upload.stream, upload.filename
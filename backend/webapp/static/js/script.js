@@ -1,4 +1,8 @@
 // BYTEME - AI TikTok Analyzer Web App
+
+// Loading step that each analysis stage of /api/analyze/stream completes
+const STAGE_STEPS = { download: 0, video: 1, audio: 1, embedding: 1, text: 1, predict: 2 };
+
 class BYTEMEAnalyzer {
     constructor() {
         this.initializeElements();
@@ -89,11 +93,14 @@ class BYTEMEAnalyzer {
         }
         
         this.showLoading();
-        this.startLoadingAnimation();
         
         try {
-            // Simulate API call to your Python backend
-            const result = await this.callAnalysisAPI(url, description);
+            // Stream stage progress from the backend; poll a queued job if the
+            // browser can't read a streamed response (decided before sending,
+            // so the analysis only runs once)
+            const result = this.canStreamResponses()
+                ? await this.callAnalysisStream(url, description)
+                : await this.callAnalysisAPI(url, description);
             this.currentAnalysis = result;
             this.displayResults(result);
         } catch (error) {
@@ -102,9 +109,98 @@ class BYTEMEAnalyzer {
         }
     }
 
+    async callAnalysisStream(url, description) {
+        // Server-sent events over a POST, read from the response body
+        const response = await fetch('/api/analyze/stream', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ url, description })
+        });
+        
+        if (!response.ok) {
+            const errorData = await response.json();
+            throw new Error(errorData.error || 'Analysis failed');
+        }
+        // The analysis is already running for this request - never submit it
+        // again. Without a readable body, wait for the whole event stream as text
+        if (!response.body) {
+            const result = this.handleServerEvents(await response.text());
+            if (result) return result;
+            throw new Error('Connection lost before the analysis finished');
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            
+            const boundary = buffer.lastIndexOf('\n\n');
+            if (boundary === -1) continue;
+            const result = this.handleServerEvents(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+            if (result) {
+                await reader.cancel();
+                return result;
+            }
+        }
+        
+        throw new Error('Connection lost before the analysis finished');
+    }
+    
+    canStreamResponses() {
+        // Whether fetch responses can be read incrementally in this browser
+        return typeof TextDecoder !== 'undefined'
+            && typeof ReadableStream !== 'undefined'
+            && 'body' in Response.prototype;
+    }
+    
+    handleServerEvents(text) {
+        // Complete events: stages update the progress, the result is returned
+        for (const block of text.split('\n\n')) {
+            const message = this.parseServerEvent(block);
+            if (!message) continue;
+            
+            if (message.event === 'result') return message.data.result;
+            if (message.event === 'error') throw new Error(message.data.error || 'Analysis failed');
+            if (message.event === 'stage') this.showStageProgress(message.data);
+        }
+        return null;
+    }
+
+    parseServerEvent(block) {
+        let event = 'message';
+        const data = [];
+        
+        for (const line of block.split('\n')) {
+            // Lines starting with ':' are keep-alive comments
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+        }
+        
+        return data.length ? { event, data: JSON.parse(data.join('\n')) } : null;
+    }
+
+    showStageProgress(stage) {
+        const index = STAGE_STEPS[stage.stage];
+        if (index === undefined) return;
+        
+        // A stage finishing completes its step and starts the next one
+        this.loadingSteps.forEach((step, i) => {
+            if (i <= index + 1) step.classList.add('active');
+        });
+        
+        const label = this.loadingSteps[index].querySelector('span');
+        label.textContent = `${label.dataset.label} (${(stage.elapsedMs / 1000).toFixed(1)}s)`;
+    }
+
     async callAnalysisAPI(url, description) {
-        // Make the actual API call to your Python backend
-        const response = await fetch('/api/analyze', {
+        // Queue the analysis on the Python backend, then poll for the result
+        this.startLoadingAnimation();
+        const response = await fetch('/api/jobs', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ url, description })
@@ -115,7 +211,28 @@ class BYTEMEAnalyzer {
             throw new Error(errorData.error || 'Analysis failed');
         }
         
-        return await response.json();
+        let job = await response.json();
+        const deadline = Date.now() + 5 * 60 * 1000;
+        
+        while (job.status === 'queued' || job.status === 'running') {
+            if (Date.now() > deadline) {
+                throw new Error('Analysis timed out');
+            }
+            await this.delay(1000);
+            
+            const statusResponse = await fetch(`/api/jobs/${job.jobId}`);
+            if (!statusResponse.ok) {
+                const errorData = await statusResponse.json();
+                throw new Error(errorData.error || 'Analysis failed');
+            }
+            job = await statusResponse.json();
+        }
+        
+        if (job.status === 'failed' || !job.result) {
+            throw new Error(job.error || 'Analysis failed');
+        }
+        
+        return job.result;
     }
 
     generateMockAnalysis(url, description) {
@@ -250,7 +367,12 @@ class BYTEMEAnalyzer {
         this.loadingSection.classList.remove('hidden');
         
         // Reset loading steps
-        this.loadingSteps.forEach(step => step.classList.remove('active'));
+        this.loadingSteps.forEach((step, i) => {
+            const label = step.querySelector('span');
+            label.dataset.label = label.dataset.label || label.textContent;
+            label.textContent = label.dataset.label;
+            step.classList.toggle('active', i === 0);
+        });
     }
 
     showError(message) {
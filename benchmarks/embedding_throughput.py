@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark: CPU frame-embedding throughput in frames/sec
+
+Embeds the sampled frames of a synthetic clip with a TorchScript CNN at
+several batch sizes and thread counts, and times a whole video's embedding
+through the extractor. Without --weights a small randomly initialised CNN
+(MobileNet-sized, 224x224 input, 256-d output) stands in for a pretrained
+one - throughput depends on the architecture, not on the trained weights.
+
+Usage: python benchmarks/embedding_throughput.py [--weights model.ts] [--batch-sizes 1 8 16 32] [--threads 1 2 4]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+from feature_extractor import TikTokFeatureExtractor
+from frame_embedding import FrameEmbedder, save_embedding_model
+from fixtures import make_synthetic_video
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+def make_reference_cnn():
+    """Depthwise-separable conv stack of roughly MobileNet's cost, ending in feature maps"""
+    from torch import nn
+    
+    def block(channels_in, channels_out, stride):
+        return nn.Sequential(
+            nn.Conv2d(channels_in, channels_in, 3, stride, 1, groups=channels_in, bias=False),
+            nn.BatchNorm2d(channels_in),
+            nn.ReLU(inplace=True),
+            nn.Conv2d(channels_in, channels_out, 1, bias=False),
+            nn.BatchNorm2d(channels_out),
+            nn.ReLU(inplace=True)
+        )
+    
+    return nn.Sequential(
+        nn.Conv2d(3, 16, 3, 2, 1, bias=False),
+        nn.BatchNorm2d(16),
+        nn.ReLU(inplace=True),
+        block(16, 32, 2),
+        block(32, 64, 2),
+        block(64, 64, 1),
+        block(64, 128, 2),
+        block(128, 128, 1),
+        block(128, 256, 2)
+    )
+
+def frames_per_second(embedder, frames, repeats):
+    """Best-of-N throughput of embedding a stack of frames"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        embeddings = embedder.embed_frames(frames)
+        best = min(best, time.perf_counter() - start)
+    return len(frames) / best, embeddings.shape[1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--weights', help="TorchScript embedding model (default: a random-init reference CNN)")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 16, 32])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--num-frames', type=int, default=30)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    import torch
+    
+    video_path = make_synthetic_video(os.path.join(FIXTURE_DIR, f'synthetic_{int(args.duration)}s.mp4'),
+                                      duration=args.duration)
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        results = {'frames': args.num_frames, 'throughput': []}
+        for batch_size in args.batch_sizes:
+            # Traced at the batch size it will run at
+            weights = args.weights or save_embedding_model(
+                make_reference_cnn(), os.path.join(workdir, f'reference_b{batch_size}.ts'), batch_size=batch_size)
+            extractor = TikTokFeatureExtractor(cache_dir=None, num_frames=args.num_frames,
+                                               embedding_model=weights, embedding_batch_size=batch_size)
+            frames = extractor._decode_frames(video_path)
+            
+            for threads in args.threads:
+                # The embedder only ever lowers torch's (process-wide) thread count
+                torch.set_num_threads(threads)
+                embedder = FrameEmbedder(weights, batch_size, threads)
+                embedder.embed_frames(frames[:batch_size])  # warm-up
+                fps, dim = frames_per_second(embedder, frames, args.repeats)
+                results['throughput'].append({
+                    'batch_size': batch_size,
+                    'threads': threads,
+                    'frames_per_s': round(fps, 1),
+                    'embedding_dim': dim
+                })
+                print(f"🧠 batch {batch_size:>3} | {threads} threads: {fps:8.1f} frames/s")
+        
+        # One video end to end (decode + embed + pool) at the default settings
+        weights = args.weights or save_embedding_model(make_reference_cnn(), os.path.join(workdir, 'reference.ts'))
+        extractor = TikTokFeatureExtractor(cache_dir=None, num_frames=args.num_frames, embedding_model=weights)
+        extractor.extract_embedding_features(video_path)
+        start = time.perf_counter()
+        extractor.extract_embedding_features(video_path)
+        results['video_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        print(f"🎬 {args.duration:.0f}s clip: {results['video_ms']:.1f} ms per video")
+    
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Synthetic video fixtures for the benchmarks
+"""
+
+import os
+import wave
+import shutil
+import subprocess
+import cv2
+import numpy as np
+
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+AUDIO_SAMPLE_RATE = 44100
+
+def audio_supported():
+    """Audio tracks are muxed in with ffmpeg - OpenCV only writes video"""
+    return shutil.which(FFMPEG_BINARY) is not None
+
+def make_synthetic_video(path, duration=10, fps=30, width=540, height=960, seed=0, audio=False):
+    """Write a synthetic MP4 with moving shapes and a scene cut every few seconds
+    
+    With audio=True the clip also gets a mono AAC track (see make_synthetic_audio).
+    """
+    
+    if os.path.exists(path):
+        return path
+    
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    video_path = f"{path}.video.mp4" if audio else path
+    rng = np.random.default_rng(seed)
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    
+    total_frames = int(duration * fps)
+    scene_length = 3 * fps
+    background = None
+    
+    for index in range(total_frames):
+        if index % scene_length == 0:
+            # New scene - new background colour and brightness
+            background = rng.integers(0, 256, size=3).tolist()
+        
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[:] = background
+        
+        # A bouncing circle so consecutive frames differ
+        x = int((np.sin(index / fps) + 1) / 2 * (width - 100)) + 50
+        y = int((np.cos(index / (2 * fps)) + 1) / 2 * (height - 100)) + 50
+        cv2.circle(frame, (x, y), 40, (255 - background[0], 255 - background[1], 255 - background[2]), -1)
+        
+        writer.write(frame)
+    
+    writer.release()
+    
+    if audio:
+        audio_path = make_synthetic_audio(f"{path}.wav", duration, seed=seed)
+        try:
+            mux_audio(video_path, audio_path, path)
+        finally:
+            os.remove(video_path)
+            os.remove(audio_path)
+    return path
+
+def make_synthetic_audio(path, duration=10, sample_rate=AUDIO_SAMPLE_RATE, seed=0):
+    """Write a mono 16-bit WAV: a tone that changes pitch with each scene, a beat and some noise"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    
+    # Same 3 second scenes as the video
+    pitches = rng.uniform(110, 880, size=int(duration // 3) + 1)
+    tone = np.sin(2 * np.pi * pitches[(t // 3).astype(int)] * t)
+    beat = (np.sin(2 * np.pi * 2 * t) > 0.9) * np.sin(2 * np.pi * 60 * t)
+    signal = 0.5 * tone + 0.3 * beat + 0.05 * rng.standard_normal(len(t))
+    
+    samples = (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.tobytes())
+    return path
+
+def mux_audio(video_path, audio_path, output_path):
+    """Combine a video-only file and a WAV into one MP4, copying the video stream"""
+    if not audio_supported():
+        raise RuntimeError(f"{FFMPEG_BINARY} is required to add audio to synthetic videos")
+    subprocess.run(
+        [
+            FFMPEG_BINARY, '-y', '-loglevel', 'error',
+            '-i', video_path, '-i', audio_path,
+            '-c:v', 'copy', '-c:a', 'aac', '-shortest',
+            output_path
+        ],
+        check=True
+    )
+    return output_path
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark: compiled inference engines vs eager PyTorch
+
+Trains a small model on synthetic features, saves it as an artifact, then
+checks each inference backend against TikTokModelTrainer.predict (parity) and
+times it at several batch sizes. Exits non-zero if a backend drifts past its
+tolerance.
+
+Usage: python benchmarks/inference_engines.py [--batch-sizes 1 16 256] [--iterations 1000]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+from simple_model import TikTokModelTrainer
+from inference import load_inference_model
+
+# Max absolute difference from the eager model allowed per backend - int8 weights
+# are allowed about 1% of the 1-10 score range
+PARITY_TOLERANCE = {'numpy': 1e-4, 'torchscript': 1e-4, 'quantized': 1e-1}
+
+def make_model(artifact_dir, input_dim, n_samples, epochs):
+    """Train on random features with very different column scales and save an artifact"""
+    rng = np.random.default_rng(0)
+    column_scales = 10.0 ** rng.uniform(-2, 3, size=input_dim)
+    X = (rng.normal(size=(n_samples, input_dim)) * column_scales).astype(np.float32)
+    y = rng.uniform(1, 10, size=(n_samples, 5)).astype(np.float32)
+    
+    trainer = TikTokModelTrainer()
+    X_train, X_test, y_train, y_test = trainer.prepare_data(X, y)
+    trainer.train(X_train, y_train, epochs=epochs, X_val=X_test, y_val=y_test, patience=0)
+    trainer.save(artifact_dir)
+    return trainer, X
+
+def time_predict(predict, X, iterations):
+    """Median per-call latency in microseconds"""
+    for _ in range(min(50, iterations)):
+        predict(X)
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        predict(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1e6)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 16, 256])
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--input-dim', type=int, default=139)
+    parser.add_argument('--samples', type=int, default=512)
+    parser.add_argument('--epochs', type=int, default=30)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as artifact_dir:
+        trainer, X = make_model(artifact_dir, args.input_dim, args.samples, args.epochs)
+        engines = {'eager': trainer}
+        for backend in PARITY_TOLERANCE:
+            engines[backend] = load_inference_model(artifact_dir, backend=backend)
+    
+    reference = trainer.predict(X)
+    results = {'parity': {}, 'latency_us': {}}
+    failed = []
+    for name, tolerance in PARITY_TOLERANCE.items():
+        error = float(np.abs(engines[name].predict(X) - reference).max())
+        results['parity'][name] = {'max_abs_error': error, 'tolerance': tolerance}
+        status = "✅" if error <= tolerance else "❌"
+        if error > tolerance:
+            failed.append(name)
+        print(f"{status} {name:<12} max |error| vs eager: {error:.2e} (tolerance {tolerance:.0e})")
+    
+    for batch_size in args.batch_sizes:
+        batch = X[np.arange(batch_size) % len(X)]
+        results['latency_us'][batch_size] = {}
+        line = []
+        for name, engine in engines.items():
+            latency = time_predict(engine.predict, batch, args.iterations)
+            results['latency_us'][batch_size][name] = round(latency, 1)
+            line.append(f"{name} {latency:8.1f} us")
+        print(f"⏱️  batch {batch_size:>4}: " + " | ".join(line))
+    
+    print(json.dumps(results, indent=2))
+    if failed:
+        print(f"❌ Parity check failed for: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
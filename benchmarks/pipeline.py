@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Benchmark: every stage of the analysis pipeline, end to end
+
+Generates synthetic clips (several durations and resolutions, with and without
+an audio track) and times each stage on its own:
+  
+  extract_video   TikTokFeatureExtractor.extract_video_features, uncached
+  extract_audio   TikTokFeatureExtractor.extract_audio_features, uncached
+  extract_text    TikTokFeatureExtractor.extract_text_features
+  train           TikTokModelTrainer.prepare_data + train on synthetic features
+  predict         TikTokModelTrainer.predict, single rows and one large batch
+  add_video       TikTokDataCollector.add_video, one row at a time
+  api_analyze     POST /api/analyze through Flask's test client, result cache
+                  missing (new description each time) and hitting (repeats)
+
+Each stage runs in a fresh interpreter, so its peak RSS is its own. The report
+(throughput, latency percentiles, peak RSS) is printed as JSON and can be saved
+with --output to compare runs across commits.
+
+Usage: python benchmarks/pipeline.py [--stages extract_video api_analyze] [--output run.json]
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import contextlib
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'src'), os.path.join(ROOT, 'backend')]
+from fixtures import make_synthetic_video, audio_supported
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+STAGES = ('extract_video', 'extract_audio', 'extract_text', 'train', 'predict', 'add_video', 'api_analyze')
+
+# (duration in seconds, width, height) of the synthetic clips; each is made with and without audio
+DEFAULT_CLIPS = ((5, 360, 640), (15, 540, 960), (30, 720, 1280))
+
+WORDS = ('dance', 'funny', 'cat', 'trend', 'challenge', 'recipe', 'prank', 'tutorial',
+         'fyp', 'viral', 'music', 'pov', 'story', 'duet', 'comedy', 'travel')
+
+def synthetic_descriptions(n, seed=0):
+    """Random short captions with hashtags, drawn from a small vocabulary"""
+    rng = np.random.default_rng(seed)
+    return [
+        ' '.join(rng.choice(WORDS, size=rng.integers(4, 12))) + ' #' + rng.choice(WORDS)
+        for _ in range(n)
+    ]
+
+def summarize(latencies, items=None, wall=None):
+    """Throughput and latency percentiles of a list of per-call durations in seconds
+    
+    items is how many things were processed in total (default: one per call),
+    wall the elapsed time they took (default: the sum of the latencies).
+    """
+    latencies = np.asarray(latencies)
+    items = len(latencies) if items is None else items
+    wall = float(latencies.sum()) if wall is None else wall
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {
+        'calls': len(latencies),
+        'throughput_per_s': round(items / wall, 2) if wall else None,
+        'mean_ms': round(float(latencies.mean()) * 1000, 3),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3)
+    }
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def timed_calls(fn, args_list):
+    """Call fn once per args tuple, returning the per-call durations"""
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def random_features(n_rows, seed=0):
+    """Synthetic feature matrix and scores with the real feature layout"""
+    from feature_extractor import VIDEO_FEATURE_DIM, TEXT_FEATURE_DIM
+    from data_collector import SCORE_COLUMNS
+    rng = np.random.default_rng(seed)
+    input_dim = VIDEO_FEATURE_DIM + 6 + TEXT_FEATURE_DIM
+    X = rng.standard_normal((n_rows, input_dim)).astype(np.float32)
+    weights = rng.standard_normal((input_dim, len(SCORE_COLUMNS))) / np.sqrt(input_dim)
+    y = np.clip(5 + 2 * np.tanh(X @ weights), 0, 10).astype(np.float32)
+    return X, y
+
+# --- Stages: each gets the settings dict and returns {result name: result} ---
+
+def bench_extract_video(settings):
+    from feature_extractor import TikTokFeatureExtractor
+    extractor = TikTokFeatureExtractor(cache_dir=None)
+    return _bench_extraction(extractor.extract_video_features, settings['clips'], settings['repeats'])
+
+def bench_extract_audio(settings):
+    from feature_extractor import TikTokFeatureExtractor
+    clips = [clip for clip in settings['clips'] if clip['audio']]
+    if not clips:
+        return {'skipped': 'no clips with audio (ffmpeg not installed)'}
+    extractor = TikTokFeatureExtractor(cache_dir=None)
+    return _bench_extraction(extractor.extract_audio_features, clips, settings['repeats'])
+
+def _bench_extraction(extract, clips, repeats):
+    # First call per clip is a warm-up (imports, codec initialisation)
+    for clip in clips:
+        extract(clip['path'])
+    
+    latencies = []
+    by_clip = {}
+    for clip in clips:
+        clip_latencies = timed_calls(extract, [(clip['path'],)] * repeats)
+        latencies.extend(clip_latencies)
+        by_clip[clip['name']] = {
+            'p50_ms': round(float(np.median(clip_latencies)) * 1000, 3),
+            'realtime_factor': round(clip['duration'] / float(np.median(clip_latencies)), 1)
+        }
+    return {'videos': {**summarize(latencies), 'by_clip': by_clip}}
+
+def bench_extract_text(settings):
+    from feature_extractor import TikTokFeatureExtractor
+    extractor = TikTokFeatureExtractor(cache_dir=None)
+    descriptions = synthetic_descriptions(settings['text_calls'], seed=1)
+    extractor.fit_text_vectorizer(synthetic_descriptions(500))
+    extractor.extract_text_features(descriptions[0])
+    
+    latencies = timed_calls(extractor.extract_text_features, [(d,) for d in descriptions])
+    start = time.perf_counter()
+    extractor.extract_text_features_batch(descriptions)
+    batch_wall = time.perf_counter() - start
+    return {
+        'single': summarize(latencies),
+        'batch': {'rows': len(descriptions), 'throughput_per_s': round(len(descriptions) / batch_wall, 2)}
+    }
+
+def bench_train(settings):
+    from simple_model import TikTokModelTrainer
+    X, y = random_features(settings['train_rows'])
+    
+    latencies = []
+    rows_seen = 0
+    epochs_run = []
+    for _ in range(settings['repeats']):
+        trainer = TikTokModelTrainer()
+        start = time.perf_counter()
+        X_train, X_test, y_train, y_test = trainer.prepare_data(X, y)
+        trainer.train(X_train, y_train, epochs=settings['epochs'], X_val=X_test, y_val=y_test)
+        latencies.append(time.perf_counter() - start)
+        rows_seen += len(X_train) * len(trainer.history)
+        epochs_run.append(len(trainer.history))
+    
+    # Throughput in training rows per second, counting every epoch
+    result = summarize(latencies, items=rows_seen)
+    result.update({'rows': len(X), 'epochs_run': epochs_run})
+    return {'train': result}
+
+def bench_predict(settings):
+    from simple_model import TikTokModelTrainer
+    X, y = random_features(settings['train_rows'])
+    trainer = TikTokModelTrainer()
+    X_train, X_test, y_train, y_test = trainer.prepare_data(X, y)
+    trainer.train(X_train, y_train, epochs=5, X_val=X_test, y_val=y_test)
+    
+    rows = X[:settings['predict_calls']]
+    trainer.predict(rows[:1])
+    latencies = timed_calls(trainer.predict, [(row[None, :],) for row in rows])
+    
+    start = time.perf_counter()
+    for _ in range(settings['repeats']):
+        trainer.predict(X)
+    batch_wall = time.perf_counter() - start
+    return {
+        'single': summarize(latencies),
+        'batch': {'rows': len(X), 'throughput_per_s': round(len(X) * settings['repeats'] / batch_wall, 2)}
+    }
+
+def bench_add_video(settings):
+    from data_collector import TikTokDataCollector, SCORE_COLUMNS
+    collector = TikTokDataCollector(data_dir=os.path.join(settings['workdir'], 'add_video'))
+    rng = np.random.default_rng(0)
+    descriptions = synthetic_descriptions(settings['add_video_rows'])
+    calls = [
+        (f"video_{i}.mp4", {name: float(rng.integers(1, 11)) for name in SCORE_COLUMNS}, description)
+        for i, description in enumerate(descriptions)
+    ]
+    
+    # add_video prints a line per row
+    with contextlib.redirect_stdout(io.StringIO()):
+        latencies = timed_calls(collector.add_video, calls)
+    return {'add_video': summarize(latencies)}
+
+def bench_api_analyze(settings):
+    clip = next((clip for clip in settings['clips'] if clip['audio']), settings['clips'][0])
+    
+    # The app reads these at import time; its data/ paths are relative to the working directory
+    os.environ['BYTEME_LOCAL_VIDEO_PATH'] = os.path.abspath(clip['path'])
+    os.environ.setdefault('BYTEME_LOG_LEVEL', 'WARNING')
+    os.chdir(settings['workdir'])
+    # Trained in another process, so training doesn't count towards the server's peak RSS
+    _in_fresh_process(_save_benchmark_model, settings)
+    
+    import app as server
+    from metrics import registry
+    client = server.app.test_client()
+    
+    def analyze(description):
+        response = client.post('/api/analyze', json={
+            'url': 'https://www.tiktok.com/@bench/video/7000000000000000000',
+            'description': description
+        })
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/analyze returned {response.status_code}: {response.get_data(as_text=True)}")
+    
+    # Warm-up: loads the model and fills the feature cache for the clip
+    analyze("warm up")
+    descriptions = synthetic_descriptions(settings['api_calls'], seed=2)
+    uncached = timed_calls(analyze, [(d,) for d in descriptions])
+    cached = timed_calls(analyze, [(descriptions[0],)] * settings['api_calls'])
+    
+    fallbacks = sum(registry.counter('byteme_heuristic_fallbacks_total', reason=reason)
+                    for reason in ('no_model', 'error'))
+    return {
+        'api_analyze': {**summarize(uncached), 'clip': clip['name'], 'heuristic_fallbacks': fallbacks},
+        'api_analyze_cached': summarize(cached)
+    }
+
+def _save_benchmark_model(settings):
+    """Train and save a small model artifact in the working directory, as train_model.py would"""
+    os.chdir(settings['workdir'])
+    from feature_extractor import TikTokFeatureExtractor, FEATURE_SCHEMA_VERSION
+    from simple_model import TikTokModelTrainer
+    extractor = TikTokFeatureExtractor()
+    extractor.fit_text_vectorizer(synthetic_descriptions(500))
+    
+    X, y = random_features(settings['train_rows'])
+    trainer = TikTokModelTrainer()
+    X_train, X_test, y_train, y_test = trainer.prepare_data(X, y)
+    with contextlib.redirect_stdout(sys.stderr):
+        trainer.train(X_train, y_train, epochs=5, X_val=X_test, y_val=y_test)
+    trainer.save(
+        feature_schema_version=FEATURE_SCHEMA_VERSION,
+        feature_config=extractor.feature_config(),
+        extras={'text_vectorizer': extractor.text_vectorizer}
+    )
+
+def _in_fresh_process(fn, *args):
+    """Run fn in a newly spawned interpreter and return its result"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(fn, *args).result()
+
+def run_stage(stage, settings):
+    """Entry point of the per-stage worker process"""
+    with contextlib.redirect_stdout(sys.stderr):
+        start = time.perf_counter()
+        results = globals()[f"bench_{stage}"](settings)
+        wall = time.perf_counter() - start
+    return {
+        'results': results,
+        'wall_s': round(wall, 2),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def make_clips(clip_specs, with_audio):
+    clips = []
+    for duration, width, height in clip_specs:
+        for audio in ((False, True) if with_audio else (False,)):
+            name = f"synthetic_{duration:g}s_{width}x{height}{'_audio' if audio else ''}"
+            path = make_synthetic_video(os.path.join(FIXTURE_DIR, f"{name}.mp4"), duration=duration,
+                                        width=width, height=height, audio=audio)
+            clips.append({'name': name, 'path': os.path.abspath(path), 'duration': duration, 'audio': audio})
+    return clips
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def parse_clip(spec):
+    """DURATIONxWIDTHxHEIGHT, e.g. 15x540x960"""
+    duration, width, height = spec.split('x')
+    return float(duration), int(width), int(height)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--clips', type=parse_clip, nargs='+', default=list(DEFAULT_CLIPS),
+                        metavar='SECONDSxWIDTHxHEIGHT')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--text-calls', type=int, default=1000)
+    parser.add_argument('--train-rows', type=int, default=2000)
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--predict-calls', type=int, default=1000)
+    parser.add_argument('--add-video-rows', type=int, default=1000)
+    parser.add_argument('--api-calls', type=int, default=50)
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+    args = parser.parse_args()
+    
+    with_audio = audio_supported()
+    if not with_audio:
+        print("⚠️  ffmpeg not found - clips have no audio and extract_audio is skipped")
+    print("🎬 Generating synthetic clips...")
+    clips = make_clips(args.clips, with_audio)
+    
+    workdir = tempfile.mkdtemp(prefix='byteme-bench-')
+    settings = {
+        'clips': clips,
+        'workdir': workdir,
+        'repeats': args.repeats,
+        'text_calls': args.text_calls,
+        'train_rows': args.train_rows,
+        'epochs': args.epochs,
+        'predict_calls': args.predict_calls,
+        'add_video_rows': args.add_video_rows,
+        'api_calls': args.api_calls
+    }
+    
+    report = {
+        'revision': git_revision(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'clips': [{key: clip[key] for key in ('name', 'duration', 'audio')} for clip in clips],
+        'stages': {}
+    }
+    try:
+        for stage in args.stages:
+            # A fresh interpreter per stage keeps imports, caches and peak RSS separate
+            stage_report = _in_fresh_process(run_stage, stage, settings)
+            report['stages'][stage] = stage_report
+            
+            for name, result in stage_report['results'].items():
+                if not isinstance(result, dict):
+                    print(f"⏭️  {stage:<14} {result}")
+                    continue
+                latency = f"p50 {result['p50_ms']:9.3f} ms | p99 {result['p99_ms']:9.3f} ms | " if 'p50_ms' in result else ""
+                print(f"⏱️  {stage}/{name:<20} {latency}{result['throughput_per_s']:>10} /s | "
+                      f"peak RSS {stage_report['peak_rss_mb']} MB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Saved report: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark: exact vs ivf similarity search over feature vectors
+
+Builds both index modes over clustered synthetic feature rows (139 columns
+with very different scales, like the real features) and reports build time,
+query latency and the ivf mode's recall of the exact top-k.
+
+Usage: python benchmarks/similarity_search.py [--rows 10000 100000] [--queries 200] [--k 10]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+from similarity_index import SimilarityIndex, IVF_PROBES
+
+def synthetic_rows(n_rows, dim, seed=0):
+    """Feature rows around a few hundred cluster centres, with per-column scales"""
+    rng = np.random.default_rng(seed)
+    column_scales = 10.0 ** rng.uniform(-2, 2, size=dim)
+    centres = rng.normal(size=(256, dim))
+    rows = centres[rng.integers(0, len(centres), n_rows)] + rng.normal(scale=0.5, size=(n_rows, dim))
+    return (rows * column_scales).astype(np.float32)
+
+def time_queries(index, queries, k, n_probe):
+    """Mean per-query latency and the neighbour ids of each query"""
+    start = time.perf_counter()
+    results = index.search_many(queries, k, n_probe)
+    elapsed = time.perf_counter() - start
+    return elapsed / len(queries), [[neighbour['id'] for neighbour in result] for result in results]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--dim', type=int, default=139)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--probes', type=int, default=IVF_PROBES)
+    args = parser.parse_args()
+    
+    results = []
+    for n_rows in args.rows:
+        X = synthetic_rows(n_rows + args.queries, args.dim)
+        X, queries = X[:n_rows], X[n_rows:]
+        ids = np.arange(1, n_rows + 1)
+        names = [f"video_{i}" for i in ids]
+        scores = np.zeros((n_rows, 5), dtype=np.float32)
+        
+        start = time.perf_counter()
+        exact = SimilarityIndex.build(X, ids, names, scores, mode='exact')
+        exact_build = time.perf_counter() - start
+        start = time.perf_counter()
+        ivf = SimilarityIndex.build(X, ids, names, scores, mode='ivf')
+        ivf_build = time.perf_counter() - start
+        
+        exact_latency, truth = time_queries(exact, queries, args.k, args.probes)
+        ivf_latency, found = time_queries(ivf, queries, args.k, args.probes)
+        recall = np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(truth, found)])
+        
+        results.append({
+            'rows': n_rows,
+            'exact_build_ms': round(exact_build * 1000, 2),
+            'ivf_build_ms': round(ivf_build * 1000, 2),
+            'exact_query_ms': round(exact_latency * 1000, 3),
+            'ivf_query_ms': round(ivf_latency * 1000, 3),
+            'ivf_recall_at_k': round(float(recall), 4)
+        })
+        
+        print(f"🔎 {n_rows:>8} rows: exact {exact_latency * 1000:7.3f} ms/query | "
+              f"ivf {ivf_latency * 1000:7.3f} ms/query (recall@{args.k} {recall:.3f})")
+    
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
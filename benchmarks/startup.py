@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark: import time of the server and CLI entry points
+
+Imports each entry point in a fresh interpreter under `python -X importtime`,
+reports its cumulative import time and checks it against a budget. Heavy
+dependencies (torch, sklearn, cv2, pandas, scipy) must only be imported on the
+code paths that use them, so they count as a failure if the import pulls them in.
+
+Usage: python benchmarks/startup.py [--repeats 5] [--budget app=800]
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Import time budget per entry point in milliseconds (best of --repeats runs)
+DEFAULT_BUDGETS_MS = {'app': 800, 'train_model': 500, 'ai_analyzer': 500}
+
+# Modules that must not be imported just by loading an entry point
+HEAVY_MODULES = ('torch', 'sklearn', 'cv2', 'pandas', 'scipy')
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+def measure_import(module):
+    """Cumulative import time in ms of module, and the top-level packages it pulled in"""
+    code = (
+        "import sys; "
+        f"sys.path[:0] = [{os.path.join(ROOT, 'src')!r}, {os.path.join(ROOT, 'backend')!r}]; "
+        f"import {module}"
+    )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    
+    cumulative_ms = None
+    packages = set()
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        packages.add(name.split('.')[0])
+        if name == module and not indent:
+            cumulative_ms = int(cumulative) / 1000
+    return cumulative_ms, packages
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--budget', action='append', default=[], metavar='MODULE=MS',
+                        help='Override the budget of one entry point')
+    args = parser.parse_args()
+    
+    budgets = dict(DEFAULT_BUDGETS_MS)
+    for override in args.budget:
+        module, ms = override.split('=')
+        budgets[module] = float(ms)
+    
+    results = {}
+    failed = []
+    for module, budget in budgets.items():
+        timings = []
+        for _ in range(args.repeats):
+            cumulative_ms, packages = measure_import(module)
+            timings.append(cumulative_ms)
+        best = min(timings)
+        heavy = sorted(packages & set(HEAVY_MODULES))
+        ok = best <= budget and not heavy
+        if not ok:
+            failed.append(module)
+    
+        results[module] = {'import_ms': round(best, 1), 'budget_ms': budget, 'heavy_imports': heavy}
+        status = "✅" if ok else "❌"
+        extra = f" | heavy imports: {', '.join(heavy)}" if heavy else ""
+        print(f"{status} {module:<12} {best:8.1f} ms (budget {budget:.0f} ms){extra}")
+    
+    print(json.dumps(results, indent=2))
+    if failed:
+        print(f"❌ Startup budget exceeded for: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,9 @@
 import { useState, useCallback } from '@lynx-js/react';
-import type { AnalysisRequest, AnalysisResponse } from './services/api.js';
+import type {
+  AnalysisProgress,
+  AnalysisRequest,
+  AnalysisResponse,
+} from './services/api.js';
 import { ApiService } from './services/api.js';
 import { Header } from './components/Header.js';
 import { InputSection } from './components/InputSection.js';
@@ -16,10 +20,12 @@ export function App() {
   const [state, setState] = useState<AppState>('input');
   const [results, setResults] = useState<AnalysisResponse | null>(null);
   const [error, setError] = useState<string>('');
+  const [progress, setProgress] = useState<AnalysisProgress | null>(null);
 
   const handleAnalyze = useCallback(async (data: AnalysisRequest) => {
     setState('loading');
     setError('');
+    setProgress(null);
 
     try {
       // Create a promise that resolves after the minimum loading time
@@ -30,7 +36,7 @@ export function App() {
       // Run the API call and the minimum load time promise concurrently
       // Wait for BOTH to complete before proceeding
       const [apiResponse] = await Promise.all([
-        ApiService.analyzeVideo(data),
+        ApiService.analyzeVideoStream(data, setProgress),
         minLoadTimePromise,
       ]);
 
@@ -62,7 +68,7 @@ export function App() {
 
       {state === 'input' && <InputSection onAnalyze={handleAnalyze} />}
 
-      {state === 'loading' && <LoadingSection />}
+      {state === 'loading' && <LoadingSection progress={progress} />}
 
       {state === 'results' && results && (
         <ResultsSection results={results} onNewAnalysis={handleNewAnalysis} />
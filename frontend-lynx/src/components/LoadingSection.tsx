@@ -1,6 +1,21 @@
 import { useState, useEffect } from '@lynx-js/react';
+import type { AnalysisProgress, AnalysisStage } from '../services/api.js';
 
-export function LoadingSection() {
+// Step that each streamed analysis stage completes
+const STAGE_STEPS: Record<AnalysisStage, number> = {
+  download: 0,
+  video: 1,
+  audio: 1,
+  embedding: 1,
+  text: 1,
+  predict: 2,
+};
+
+interface LoadingSectionProps {
+  progress?: AnalysisProgress | null;
+}
+
+export function LoadingSection({ progress }: LoadingSectionProps) {
   const [currentStep, setCurrentStep] = useState(0);
 
   const steps = [
@@ -11,12 +26,22 @@ export function LoadingSection() {
   ];
 
   useEffect(() => {
+    // Real progress from the stream replaces the placeholder animation
+    if (progress) {
+      // Stages from a newer server than this client are skipped
+      const step = STAGE_STEPS[progress.stage];
+      if (step !== undefined) {
+        setCurrentStep(Math.min(step + 1, steps.length - 1));
+      }
+      return;
+    }
+
     const interval = setInterval(() => {
       setCurrentStep((prev) => (prev + 1) % steps.length);
     }, 1500);
 
     return () => clearInterval(interval);
-  }, []);
+  }, [progress]);
 
   return (
     <view className="loading-section">
@@ -26,7 +51,9 @@ export function LoadingSection() {
         </view>
         <text className="loading-title">Analyzing Video...</text>
         <text className="loading-subtitle">
-          Our AI is processing your TikTok video
+          {progress
+            ? `Finished ${progress.stage} (${(progress.elapsedMs / 1000).toFixed(1)}s)`
+            : 'Our AI is processing your TikTok video'}
         </text>
 
         <view className="loading-steps">
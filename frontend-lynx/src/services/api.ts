@@ -1,5 +1,8 @@
 const API_BASE_URL = 'http://localhost:8080/api';
 
+const JOB_POLL_INTERVAL_MS = 1000;
+const JOB_TIMEOUT_MS = 5 * 60 * 1000;
+
 export interface AnalysisRequest {
   url: string;
   description?: string;
@@ -20,6 +23,27 @@ export interface AnalysisResponse {
   advice: string;
 }
 
+export type AnalysisStage = 'download' | 'video' | 'audio' | 'embedding' | 'text' | 'predict';
+
+// One 'stage' event of /api/analyze/stream
+export interface AnalysisProgress {
+  stage: AnalysisStage;
+  ms: number;
+  elapsedMs: number;
+  partial: Record<string, unknown>;
+}
+
+export type JobStatus = 'queued' | 'running' | 'done' | 'failed' | 'cancelled';
+
+export interface AnalysisJob {
+  jobId: string;
+  status: JobStatus;
+  result: AnalysisResponse | null;
+  error: string | null;
+  createdAt: number;
+  updatedAt: number;
+}
+
 export class ApiService {
   static async analyzeVideo(data: AnalysisRequest): Promise<AnalysisResponse> {
     const response = await fetch(`${API_BASE_URL}/analyze`, {
@@ -38,8 +62,170 @@ export class ApiService {
     return response.json();
   }
 
+  static async submitAnalysisJob(data: AnalysisRequest): Promise<AnalysisJob> {
+    const response = await fetch(`${API_BASE_URL}/jobs`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify(data),
+    });
+
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.error || 'Could not start analysis');
+    }
+
+    return response.json();
+  }
+
+  static async getAnalysisJob(jobId: string): Promise<AnalysisJob> {
+    const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.error || 'Could not fetch analysis status');
+    }
+
+    return response.json();
+  }
+
+  // Queue the analysis and poll for the result instead of holding the
+  // connection open for the whole download + analysis
+  static async analyzeVideoAsync(
+    data: AnalysisRequest,
+  ): Promise<AnalysisResponse> {
+    let job = await ApiService.submitAnalysisJob(data);
+    const deadline = Date.now() + JOB_TIMEOUT_MS;
+
+    while (job.status === 'queued' || job.status === 'running') {
+      if (Date.now() > deadline) {
+        throw new Error('Analysis timed out');
+      }
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+      job = await ApiService.getAnalysisJob(job.jobId);
+    }
+
+    if (job.status === 'failed' || !job.result) {
+      throw new Error(job.error || 'Analysis failed');
+    }
+
+    return job.result;
+  }
+
+  // Stream the analysis as server-sent events, reporting each finished stage.
+  // Runtimes that can't read a streamed body use the queued job instead -
+  // decided before anything is sent, so the analysis only runs once
+  static async analyzeVideoStream(
+    data: AnalysisRequest,
+    onProgress: (progress: AnalysisProgress) => void,
+  ): Promise<AnalysisResponse> {
+    if (!canStreamResponses()) {
+      return ApiService.analyzeVideoAsync(data);
+    }
+
+    const response = await fetch(`${API_BASE_URL}/analyze/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify(data),
+    });
+
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.error || 'Analysis failed');
+    }
+    // The analysis is already running for this request - never submit it again.
+    // Without a readable body, wait for the whole event stream as text
+    if (!response.body) {
+      const result = handleServerEvents(await response.text(), onProgress);
+      if (result) {
+        return result;
+      }
+      throw new Error('Connection lost before the analysis finished');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) {
+        break;
+      }
+      buffer += decoder.decode(value, { stream: true });
+
+      const boundary = buffer.lastIndexOf('\n\n');
+      if (boundary === -1) {
+        continue;
+      }
+      const result = handleServerEvents(buffer.slice(0, boundary), onProgress);
+      buffer = buffer.slice(boundary + 2);
+      if (result) {
+        await reader.cancel();
+        return result;
+      }
+    }
+
+    throw new Error('Connection lost before the analysis finished');
+  }
+
   static async healthCheck(): Promise<{ status: string; message: string }> {
     const response = await fetch(`${API_BASE_URL}/health`);
     return response.json();
   }
-}
\ No newline at end of file
+}
+
+// Whether fetch responses can be read incrementally in this runtime
+function canStreamResponses(): boolean {
+  return (
+    typeof TextDecoder !== 'undefined' &&
+    typeof ReadableStream !== 'undefined' &&
+    typeof Response !== 'undefined' &&
+    'body' in Response.prototype
+  );
+}
+
+// Handle complete server-sent events: stage events go to onProgress, and the
+// result is returned once it arrives (an error event throws)
+function handleServerEvents(
+  text: string,
+  onProgress: (progress: AnalysisProgress) => void,
+): AnalysisResponse | null {
+  for (const block of text.split('\n\n')) {
+    const message = parseServerEvent(block);
+    if (!message) {
+      continue;
+    }
+    if (message.event === 'result') {
+      return message.data.result as AnalysisResponse;
+    }
+    if (message.event === 'error') {
+      throw new Error((message.data.error as string) || 'Analysis failed');
+    }
+    if (message.event === 'stage') {
+      onProgress(message.data as unknown as AnalysisProgress);
+    }
+  }
+  return null;
+}
+
+// Parse one server-sent event block; keep-alive comments (':') give null
+function parseServerEvent(
+  block: string,
+): { event: string; data: Record<string, unknown> } | null {
+  let event = 'message';
+  const data: string[] = [];
+
+  for (const line of block.split('\n')) {
+    if (line.startsWith('event:')) {
+      event = line.slice(6).trim();
+    } else if (line.startsWith('data:')) {
+      data.push(line.slice(5).trim());
+    }
+  }
+
+  return data.length ? { event, data: JSON.parse(data.join('\n')) } : null;
+}
@@ -1,51 +1,176 @@
 import os
-import pandas as pd
-import cv2
-import numpy as np
+import hashlib
+import sqlite3
+from contextlib import closing
+
+SCORE_COLUMNS = ['accuracy', 'homogeneity', 'comedy', 'theatrism', 'coherence']
+COLUMNS = ['video_name', 'video_path', 'description'] + SCORE_COLUMNS
 
 class TikTokDataCollector:
     def __init__(self, data_dir="data"):
         self.data_dir = data_dir
         self.videos_dir = os.path.join(data_dir, "videos")
         self.annotations_file = os.path.join(data_dir, "annotations.csv")
+        self.database_file = os.path.join(data_dir, "annotations.db")
+        
+        # Called with the new row ids after every add (see subscribe)
+        self._listeners = []
         
         # Create directories if they don't exist
         os.makedirs(self.videos_dir, exist_ok=True)
         
-    def add_video(self, video_path, scores, description=""):
-        """Add a video with manual scores"""
-        # Copy video to data directory
+        self._init_database()
+    
+    def subscribe(self, listener):
+        """Call listener(row_ids) after each add_video/add_videos, e.g. to index the new videos"""
+        self._listeners.append(listener)
+    
+    def _notify(self, row_ids):
+        for listener in self._listeners:
+            listener(row_ids)
+    
+    def _connect(self):
+        """Open a connection to the dataset database"""
+        # Generous timeout: writers queue up behind each other instead of failing
+        conn = sqlite3.connect(self.database_file, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+    
+    def _init_database(self):
+        """Create the schema and import annotations.csv the first time"""
+        with closing(self._connect()) as conn:
+            # WAL lets readers run while a writer appends
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS annotations (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        video_name TEXT NOT NULL,
+                        video_path TEXT NOT NULL,
+                        description TEXT,
+                        accuracy REAL, homogeneity REAL, comedy REAL, theatrism REAL, coherence REAL
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_annotations_video_name ON annotations (video_name)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_annotations_video_path ON annotations (video_path)")
+                conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            
+            self._migrate_csv(conn)
+    
+    def _migrate_csv(self, conn):
+        """Copy rows from a legacy annotations.csv into the database, once"""
+        if not os.path.exists(self.annotations_file):
+            return
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'csv_migrated'").fetchone():
+            return
+        
+        # IMMEDIATE takes the write lock up front, so two processes can't both migrate
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migrated = conn.execute("SELECT value FROM meta WHERE key = 'csv_migrated'").fetchone()
+            if migrated is None:
+                import pandas as pd
+                df = pd.read_csv(self.annotations_file)
+                rows = [self._row(record) for record in df.to_dict('records')]
+                conn.executemany(self._insert_sql(), rows)
+                conn.execute("INSERT INTO meta (key, value) VALUES ('csv_migrated', ?)", (self.annotations_file,))
+                print(f"📦 Migrated {len(rows)} videos from {self.annotations_file}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    
+    @staticmethod
+    def _insert_sql():
+        return f"INSERT INTO annotations ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+    
+    @staticmethod
+    def _row(record):
+        """Tuple of column values for an annotation record"""
+        description = record.get('description')
+        return (
+            record['video_name'],
+            record['video_path'],
+            description if isinstance(description, str) else "",
+            *(record.get(name, 0) for name in SCORE_COLUMNS)
+        )
+    
+    def _video_record(self, video_path, scores, description=""):
+        """Annotation record for a video with manual scores"""
         video_name = os.path.basename(video_path)
         dest_path = os.path.join(self.videos_dir, video_name)
         
         # For now, just record the path
-        video_data = {
+        return {
             'video_name': video_name,
             'video_path': dest_path,
             'description': description,
-            'accuracy': scores.get('accuracy', 0),
-            'homogeneity': scores.get('homogeneity', 0),
-            'comedy': scores.get('comedy', 0),
-            'theatrism': scores.get('theatrism', 0),
-            'coherence': scores.get('coherence', 0)
+            **{name: scores.get(name, 0) for name in SCORE_COLUMNS}
         }
         
-        # Save to CSV
-        if os.path.exists(self.annotations_file):
-            df = pd.read_csv(self.annotations_file)
-            df = pd.concat([df, pd.DataFrame([video_data])], ignore_index=True)
-        else:
-            df = pd.DataFrame([video_data])
+    def add_video(self, video_path, scores, description=""):
+        """Add a video with manual scores, returning its row id"""
+        video_data = self._video_record(video_path, scores, description)
         
-        df.to_csv(self.annotations_file, index=False)
+        # Single-row append - no rewrite of the existing data
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(self._insert_sql(), self._row(video_data))
         
-        print(f"Added video: {video_name}")
+        print(f"Added video: {video_data['video_name']}")
+        self._notify([cursor.lastrowid])
+        return cursor.lastrowid
+    
+    def add_videos(self, videos):
+        """Bulk-add (video_path, scores, description) tuples in one transaction"""
+        rows = [self._row(self._video_record(*video)) for video in videos]
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(self._insert_sql(), rows)
+            # The transaction holds the write lock, so the new rows have the highest ids
+            last_id = conn.execute("SELECT MAX(id) FROM annotations").fetchone()[0]
+        
+        print(f"Added {len(rows)} videos")
+        if rows:
+            self._notify(list(range(last_id - len(rows) + 1, last_id + 1)))
+        return len(rows)
+    
+    def iter_videos(self, batch_size=500, after_id=0):
+        """Stream annotation rows as dicts without loading the whole dataset"""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                f"SELECT id, {', '.join(COLUMNS)} FROM annotations WHERE id > ? ORDER BY id", (after_id,)
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
         
     def get_dataset(self):
         """Load the dataset"""
-        if os.path.exists(self.annotations_file):
-            return pd.read_csv(self.annotations_file)
-        return pd.DataFrame()
+        # pandas is only needed here - keep it out of the import path of the CLI and server
+        import pandas as pd
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(f"SELECT id, {', '.join(COLUMNS)} FROM annotations ORDER BY id", conn)
+    
+    def fingerprint(self, up_to_id=None):
+        """Identity of the dataset contents, used to detect stale model artifacts
+        
+        up_to_id fingerprints the dataset as it was when that row was the last
+        one, e.g. the snapshot a model was trained on.
+        """
+        with closing(self._connect()) as conn:
+            if up_to_id is None:
+                count, last_id = conn.execute("SELECT COUNT(*), MAX(id) FROM annotations").fetchone()
+            else:
+                count, last_id = conn.execute(
+                    "SELECT COUNT(*), MAX(id) FROM annotations WHERE id <= ?", (int(up_to_id),)
+                ).fetchone()
+        if count == 0:
+            return None
+        # Rows are only ever appended, so count and last id identify the contents
+        return hashlib.sha256(f"{count}:{last_id}".encode()).hexdigest()
 
 # Example usage
 if __name__ == "__main__":
@@ -60,4 +185,4 @@ if __name__ == "__main__":
         'coherence': 9
     }
     
-    # collector.add_video("path/to/your/video.mp4", scores, "Funny cooking tutorial")
\ No newline at end of file
+    # collector.add_video("path/to/your/video.mp4", scores, "Funny cooking tutorial")
@@ -0,0 +1,177 @@
+"""
+Concurrent TikTok downloads with yt-dlp - deterministic paths, deduplicated requests
+"""
+
+import os
+import re
+import glob
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+DEFAULT_DOWNLOAD_DIR = os.path.join("data", "videos")
+YTDLP_BINARY = os.environ.get('YTDLP_BINARY', 'yt-dlp')
+
+# Concurrent yt-dlp processes per manager, and how long/often to try each URL
+MAX_CONCURRENT_DOWNLOADS = int(os.environ.get('BYTEME_DOWNLOAD_WORKERS', 4))
+DOWNLOAD_TIMEOUT = 120
+DOWNLOAD_RETRIES = 2
+RETRY_BACKOFF = 2.0
+
+VIDEO_EXTENSIONS = ('.mp4', '.webm', '.mkv', '.mov')
+
+# tiktok.com/@user/video/<id>, m.tiktok.com/v/<id>.html, ...?item_id=<id>
+TIKTOK_VIDEO_ID = re.compile(r'(?:/video/|/v/|[?&]item_id=)(\d{8,})')
+
+class DownloadError(Exception):
+    """A video could not be downloaded"""
+
+def video_key(url):
+    """Stable file name stem for a URL: the TikTok video id when the URL has one
+    
+    Short links (vm.tiktok.com/...) don't contain the id, so they fall back to
+    a hash of the URL without its query string and fragment.
+    """
+    match = TIKTOK_VIDEO_ID.search(url)
+    if match:
+        return f"tiktok-{match.group(1)}"
+    parts = urlsplit(url.strip())
+    normalized = f"{parts.netloc.lower()}{parts.path.rstrip('/')}"
+    return f"url-{hashlib.sha256(normalized.encode()).hexdigest()[:16]}"
+
+class DownloadManager:
+    """Downloads videos into output_dir on a bounded pool of yt-dlp processes
+    
+    Every URL maps to one file, <video key><ext>, so results never depend on
+    what else is in the directory. A URL that is already on disk isn't fetched
+    again, and concurrent requests for the same URL share one download.
+    """
+    
+    def __init__(self, output_dir=DEFAULT_DOWNLOAD_DIR, max_workers=MAX_CONCURRENT_DOWNLOADS,
+                 timeout=DOWNLOAD_TIMEOUT, retries=DOWNLOAD_RETRIES):
+        self.output_dir = output_dir
+        self.timeout = timeout
+        self.retries = retries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='download')
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+    
+    def submit(self, url):
+        """Start downloading url; returns a Future of (video_path, title)"""
+        key = video_key(url)
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future
+            
+            existing = self.find(key)
+            if existing is not None:
+                future = Future()
+                future.set_result(existing)
+                return future
+            
+            future = self._executor.submit(self._download, url, key)
+            self._in_flight[key] = future
+        future.add_done_callback(lambda _: self._forget(key))
+        return future
+    
+    def download(self, url):
+        """Download url (or reuse the file already on disk), returning (video_path, title)"""
+        return self.submit(url).result()
+    
+    def find(self, key):
+        """(video_path, title) of an already downloaded video, None if it isn't on disk"""
+        for extension in VIDEO_EXTENSIONS:
+            path = os.path.join(self.output_dir, key + extension)
+            if os.path.exists(path):
+                return path, self._read_title(key)
+        return None
+    
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+    
+    def _forget(self, key):
+        with self._lock:
+            self._in_flight.pop(key, None)
+    
+    def _download(self, url, key):
+        """Run yt-dlp with retries and move the result to its deterministic path"""
+        if shutil.which(YTDLP_BINARY) is None:
+            raise DownloadError(f"{YTDLP_BINARY} is not installed")
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+            # Unique temporary name, so an interrupted attempt never looks like a finished file
+            tmp_stem = os.path.join(self.output_dir, f".{key}.{uuid.uuid4().hex[:8]}")
+            try:
+                result = subprocess.run(
+                    [
+                        YTDLP_BINARY,
+                        '-f', 'b',
+                        '-o', f"{tmp_stem}.%(ext)s",
+                        '--no-playlist',
+                        '--no-progress',
+                        '--print', 'after_move:filepath',
+                        '--print', 'after_move:title',
+                        url
+                    ],
+                    capture_output=True, text=True, timeout=self.timeout
+                )
+                if result.returncode != 0:
+                    raise DownloadError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else
+                                        f"yt-dlp exited with {result.returncode}")
+                
+                printed = result.stdout.strip().splitlines()
+                if len(printed) < 2 or not os.path.exists(printed[0]):
+                    raise DownloadError("yt-dlp did not report a downloaded file")
+                tmp_path, title = printed[0], printed[1]
+                
+                extension = os.path.splitext(tmp_path)[1].lower()
+                if extension not in VIDEO_EXTENSIONS:
+                    extension = '.mp4'
+                video_path = os.path.join(self.output_dir, key + extension)
+                self._write_title(key, url, title)
+                os.replace(tmp_path, video_path)
+                return video_path, title
+            except subprocess.TimeoutExpired:
+                error = DownloadError(f"Timed out after {self.timeout}s")
+            except DownloadError as e:
+                error = e
+            finally:
+                for leftover in glob.glob(glob.escape(tmp_stem) + '*'):
+                    os.remove(leftover)
+        raise DownloadError(f"Failed to download {url}: {error}")
+    
+    def _info_path(self, key):
+        return os.path.join(self.output_dir, f".{key}.json")
+    
+    def _write_title(self, key, url, title):
+        with open(self._info_path(key), 'w') as f:
+            json.dump({'url': url, 'title': title}, f)
+    
+    def _read_title(self, key):
+        try:
+            with open(self._info_path(key)) as f:
+                return json.load(f).get('title') or key
+        except (OSError, ValueError):
+            return key
+
+# One manager per output directory and process, shared by all threads
+_managers = {}
+_managers_lock = threading.Lock()
+
+def get_download_manager(output_dir=DEFAULT_DOWNLOAD_DIR):
+    """The process-wide download manager for output_dir"""
+    key = os.path.abspath(output_dir)
+    with _managers_lock:
+        if key not in _managers:
+            _managers[key] = DownloadManager(output_dir)
+        return _managers[key]
@@ -0,0 +1,156 @@
+"""
+Compiled training datasets - extracted features stored as memory-mapped arrays
+"""
+
+import json
+import os
+import shutil
+import numpy as np
+from numpy.lib.format import open_memmap
+from data_collector import SCORE_COLUMNS
+
+DEFAULT_DATASET_DIR = os.path.join("data", "compiled")
+FEATURES_FILE = "features.npy"
+SCORES_FILE = "scores.npy"
+MANIFEST_FILE = "manifest.json"
+
+# Videos extracted per extract_many call while compiling
+COMPILE_CHUNK_ROWS = 256
+
+# Seed of the row order - rows are stored shuffled so train/test splits are slices
+SHUFFLE_SEED = 42
+
+def compile_dataset(collector, extractor, dataset_dir=DEFAULT_DATASET_DIR, score_columns=SCORE_COLUMNS,
+                    feature_schema_version=None, workers=None, chunk_rows=COMPILE_CHUNK_ROWS):
+    """Extract features for every annotated video into memory-mapped .npy files
+    
+    Videos are extracted chunk by chunk and written straight into features.npy
+    and scores.npy (float32), so the feature matrix never has to fit in memory.
+    Rows are stored in a fixed shuffled order, and manifest.json maps each row
+    back to its annotation id. The extractor's text vectorizer must already be
+    fitted. Returns the manifest.
+    """
+    rows = [
+        {'id': row['id'], 'video_name': row['video_name'], 'video_path': row['video_path'],
+         'description': row['description'], 'scores': [row[column] for column in score_columns]}
+        for row in collector.iter_videos()
+    ]
+    order = np.random.default_rng(SHUFFLE_SEED).permutation(len(rows))
+    
+    # Build into a scratch directory and swap it in once complete
+    tmp_dir = dataset_dir.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    
+    features = None
+    scores = open_memmap(os.path.join(tmp_dir, SCORES_FILE), mode='w+', dtype=np.float32,
+                         shape=(len(rows), len(score_columns)))
+    row_ids = []
+    video_names = []
+    failures = {}
+    
+    for start in range(0, len(rows), chunk_rows):
+        chunk = [rows[index] for index in order[start:start + chunk_rows]]
+        X, chunk_failures = extractor.extract_many(
+            [row['video_path'] for row in chunk], [row['description'] for row in chunk], workers=workers
+        )
+        for index, error in chunk_failures.items():
+            failures[chunk[index]['id']] = error
+        if len(X) == 0:
+            continue
+    
+        if features is None:
+            # Capacity for every row; manifest n_rows says how many are filled in
+            features = open_memmap(os.path.join(tmp_dir, FEATURES_FILE), mode='w+', dtype=np.float32,
+                                   shape=(len(rows), X.shape[1]))
+    
+        valid = [row for index, row in enumerate(chunk) if index not in chunk_failures]
+        end = len(row_ids) + len(valid)
+        features[len(row_ids):end] = X
+        scores[len(row_ids):end] = [row['scores'] for row in valid]
+        row_ids.extend(row['id'] for row in valid)
+        video_names.extend(row['video_name'] for row in valid)
+        print(f"📦 Compiled {end}/{len(rows)} videos")
+    
+    feature_dim = 0
+    if features is not None:
+        feature_dim = features.shape[1]
+        features.flush()
+    scores.flush()
+    del features, scores
+    
+    last_row_id = max((row['id'] for row in rows), default=0)
+    manifest = {
+        'n_rows': len(row_ids),
+        'feature_dim': feature_dim,
+        'score_columns': list(score_columns),
+        'row_ids': row_ids,
+        'video_names': video_names,
+        'failures': failures,
+        'last_row_id': last_row_id,
+        'dataset_fingerprint': collector.fingerprint(up_to_id=last_row_id),
+        'feature_schema_version': feature_schema_version,
+        'feature_config': extractor.feature_config()
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    
+    shutil.rmtree(dataset_dir, ignore_errors=True)
+    os.replace(tmp_dir, dataset_dir)
+    return manifest
+
+def read_manifest(dataset_dir=DEFAULT_DATASET_DIR):
+    """Manifest of a compiled dataset, None if there isn't one"""
+    try:
+        with open(os.path.join(dataset_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def dataset_is_stale(dataset_dir, dataset_fingerprint, feature_schema_version=None, feature_config=None):
+    """Whether the compiled dataset is missing or was built from other data or features"""
+    manifest = read_manifest(dataset_dir)
+    if manifest is None:
+        return True
+    if manifest.get('dataset_fingerprint') != dataset_fingerprint:
+        return True
+    if feature_schema_version is not None and manifest.get('feature_schema_version') != feature_schema_version:
+        return True
+    if feature_config is not None and manifest.get('feature_config') != feature_config:
+        return True
+    return False
+
+def load_compiled_dataset(dataset_dir=DEFAULT_DATASET_DIR):
+    """Open a compiled dataset as read-only memory maps
+    
+    Returns (X, y, manifest). X and y are zero-copy views of the filled rows;
+    pages are only read from disk as slices of them are used.
+    """
+    manifest = read_manifest(dataset_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No compiled dataset in {dataset_dir}")
+    n_rows = manifest['n_rows']
+    if n_rows == 0:
+        return np.empty((0, 0), dtype=np.float32), np.empty((0, len(manifest['score_columns'])), dtype=np.float32), manifest
+    X = np.load(os.path.join(dataset_dir, FEATURES_FILE), mmap_mode='r')[:n_rows]
+    y = np.load(os.path.join(dataset_dir, SCORES_FILE), mmap_mode='r')[:n_rows]
+    return X, y, manifest
+
+def sample_compiled_rows(dataset_dir, n_rows, feature_schema_version=None, feature_config=None, seed=None):
+    """Random sample of up to n_rows (X, y) rows of a compiled dataset, read into memory
+    
+    None if there is no compiled dataset, it is empty, or its features were
+    extracted with another schema version or config.
+    """
+    manifest = read_manifest(dataset_dir)
+    if manifest is None or manifest['n_rows'] == 0:
+        return None
+    if feature_schema_version is not None and manifest.get('feature_schema_version') != feature_schema_version:
+        return None
+    if feature_config is not None and manifest.get('feature_config') != feature_config:
+        return None
+    
+    X, y, _ = load_compiled_dataset(dataset_dir)
+    # Sorted indices read the memory maps front to back
+    rows = np.sort(np.random.default_rng(seed).choice(len(X), min(n_rows, len(X)), replace=False))
+    return np.asarray(X[rows]), np.asarray(y[rows])
@@ -1,91 +1,729 @@
-import cv2
+import os
+import json
+import shutil
+import hashlib
+import threading
+import contextvars
+import subprocess
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import numpy as np
 import librosa
-from sklearn.feature_extraction.text import TfidfVectorizer
+from metrics import timed, increment
+from frame_embedding import DEFAULT_EMBEDDING_MODEL, EMBEDDING_BATCH_SIZE, get_frame_embedder, weights_hash
+
+# Bump whenever the layout or meaning of the extracted feature vector changes,
+# so saved model artifacts trained on the old layout get retrained
+FEATURE_SCHEMA_VERSION = 5
+
+# Frame sampling modes for extract_video_features
+FRAME_SAMPLING_MODES = ('uniform', 'sequential')
+
+# Video vector layout: brightness mean, brightness std, brightness change over
+# time, mean B/G/R, motion energy mean/max, cut rate, then a BGR colour histogram
+HISTOGRAM_BINS = 8
+VIDEO_FEATURE_DIM = 9 + 3 * HISTOGRAM_BINS
+
+# Mean absolute frame difference above which two sampled frames count as a cut
+CUT_THRESHOLD = 30
+
+# Text vectorizers: 'tfidf' is fitted once on the training descriptions,
+# 'hashing' is stateless and needs no fitting
+TEXT_VECTORIZERS = ('tfidf', 'hashing')
+TEXT_FEATURE_DIM = 100
+
+# Audio decoding backends for extract_audio_features ('auto' picks ffmpeg if installed)
+AUDIO_BACKENDS = ('auto', 'ffmpeg', 'librosa')
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+
+# STFT settings for the audio features, and how much PCM to decode per chunk
+AUDIO_N_FFT = 2048
+AUDIO_HOP_LENGTH = 512
+AUDIO_CHUNK_HOPS = 256
+
+# Seek instead of grabbing when the next sampled frame is further away than this
+SEEK_MIN_GAP = 16
+
+DEFAULT_CACHE_DIR = os.path.join("data", "feature_cache")
+DEFAULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Files whose content hash is remembered in memory (least recently used dropped first)
+CONTENT_HASH_MEMO_SIZE = 4096
+
+class UndecodableVideoError(ValueError):
+    """Not a single video frame could be decoded from a file (raised by feature extraction)"""
+
+class FeatureCache:
+    """On-disk LRU cache of per-modality feature vectors keyed by file content"""
+    
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._content_hashes = OrderedDict()
+        self._total_bytes = None
+        self._lock = threading.Lock()
+        
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    def __getstate__(self):
+        # Locks can't be pickled; worker processes get a fresh one
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+    
+    def content_hash(self, path):
+        """SHA-256 of the file contents, memoized on (path, size, mtime)"""
+        stat = os.stat(path)
+        stat_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        
+        with self._lock:
+            content_hash = self._content_hashes.get(stat_key)
+            if content_hash is not None:
+                self._content_hashes.move_to_end(stat_key)
+                return content_hash
+        
+        # Hash outside the lock - other threads keep using the cache meanwhile
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+        self._memoize_content_hash(stat_key, content_hash)
+        return content_hash
+    
+    def remember_content_hash(self, path, content_hash):
+        """Record a file's SHA-256 computed elsewhere (e.g. while it was uploaded)"""
+        stat = os.stat(path)
+        self._memoize_content_hash((os.path.abspath(path), stat.st_size, stat.st_mtime_ns), content_hash)
+    
+    def _memoize_content_hash(self, stat_key, content_hash):
+        with self._lock:
+            self._content_hashes[stat_key] = content_hash
+            self._content_hashes.move_to_end(stat_key)
+            while len(self._content_hashes) > CONTENT_HASH_MEMO_SIZE:
+                self._content_hashes.popitem(last=False)
+    
+    def key(self, path, modality, config):
+        """Cache key for one modality of one file under a given extractor config"""
+        key_data = json.dumps({
+            'content': self.content_hash(path),
+            'modality': modality,
+            'config': config,
+            'schema': FEATURE_SCHEMA_VERSION
+        }, sort_keys=True)
+        return hashlib.sha256(key_data.encode()).hexdigest()
+    
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npy")
+    
+    def get(self, key):
+        """Return the cached vector for key, or None on a miss"""
+        entry_path = self._entry_path(key)
+        try:
+            vector = np.load(entry_path, allow_pickle=False)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # Corrupt or partially written entry - drop it and recompute
+            self._remove(entry_path)
+            return None
+        
+        # Touch the entry so eviction treats it as recently used
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return vector
+    
+    def put(self, key, vector):
+        """Store a vector as a compact float32 .npy entry"""
+        vector = np.asarray(vector, dtype=np.float32)
+        entry_path = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        
+        # Write to a temp file and rename so concurrent readers never see partial data
+        tmp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, vector, allow_pickle=False)
+        os.replace(tmp_path, entry_path)
+        
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += os.path.getsize(entry_path)
+        self._evict_if_needed()
+        return vector
+    
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.npy'):
+                    yield os.path.join(root, name)
+    
+    def _remove(self, entry_path):
+        try:
+            size = os.path.getsize(entry_path)
+            os.remove(entry_path)
+        except OSError:
+            return
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes -= size
+    
+    def _evict_if_needed(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(os.path.getsize(p) for p in self._entries())
+            if self._total_bytes <= self.max_bytes:
+                return
+        
+        entries = []
+        for entry_path in self._entries():
+            try:
+                stat = os.stat(entry_path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+        entries.sort()
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(entry_path)
+            except OSError:
+                continue
+            total -= size
+        
+        with self._lock:
+            self._total_bytes = total
 
 class TikTokFeatureExtractor:
-    def __init__(self):
-        self.text_vectorizer = TfidfVectorizer(max_features=100)
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, cache_max_bytes=DEFAULT_CACHE_MAX_BYTES,
+                 frame_sampling='uniform', num_frames=30, frame_stride=None,
+                 audio_backend='auto', audio_sample_rate=16000, audio_max_duration=None,
+                 text_vectorizer='tfidf',
+                 embedding_model=DEFAULT_EMBEDDING_MODEL, embedding_batch_size=EMBEDDING_BATCH_SIZE):
+        if frame_sampling not in FRAME_SAMPLING_MODES:
+            raise ValueError(f"Unknown frame sampling mode: {frame_sampling}")
+        if text_vectorizer not in TEXT_VECTORIZERS:
+            raise ValueError(f"Unknown text vectorizer: {text_vectorizer}")
+        if audio_backend not in AUDIO_BACKENDS:
+            raise ValueError(f"Unknown audio backend: {audio_backend}")
+        if audio_backend == 'auto':
+            audio_backend = 'ffmpeg' if shutil.which(FFMPEG_BINARY) else 'librosa'
+        
+        self.text_config = {'vectorizer': text_vectorizer, 'dim': TEXT_FEATURE_DIM}
+        # Created on first use - importing sklearn takes over a second
+        self._text_vectorizer = None
         
+        # Extraction settings that change the output - part of the cache key.
+        # 'uniform' sampling spreads num_frames across the whole clip (or steps by
+        # frame_stride when set); 'sequential' decodes the first num_frames frames
+        self.video_config = {
+            'frame_sampling': frame_sampling,
+            'num_frames': num_frames,
+            'frame_stride': frame_stride,
+            'frame_size': 224
+        }
+        # 'ffmpeg' streams mono PCM straight out of the container; 'librosa' decodes
+        # the whole file. audio_max_duration limits decoding to the first N seconds
+        self.audio_config = {
+            'backend': audio_backend,
+            'sample_rate': audio_sample_rate,
+            'max_duration': audio_max_duration,
+            'n_mfcc': 5
+        }
+        
+        # Optional CNN embedding of the sampled frames (a TorchScript weights file,
+        # see frame_embedding). Keyed by the weights' hash, so swapping the model
+        # re-embeds; the batch size doesn't change the output and isn't part of it
+        self.embedding_config = None
+        self.embedding_batch_size = embedding_batch_size
+        if embedding_model:
+            self.embedding_config = {
+                'model': os.path.basename(embedding_model),
+                'weights': weights_hash(embedding_model),
+                'pooling': 'mean',
+                'frames': self.video_config
+            }
+        self.embedding_model = embedding_model
+        
+        # Pass cache_dir=None to disable the feature cache
+        self.cache = FeatureCache(cache_dir, cache_max_bytes) if cache_dir else None
+    
+    @property
+    def text_vectorizer(self):
+        """The text vectorizer for text_config, created on first use"""
+        if self._text_vectorizer is None:
+            from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+            if self.text_config['vectorizer'] == 'hashing':
+                self._text_vectorizer = HashingVectorizer(n_features=TEXT_FEATURE_DIM, alternate_sign=False)
+            else:
+                self._text_vectorizer = TfidfVectorizer(max_features=TEXT_FEATURE_DIM)
+        return self._text_vectorizer
+    
+    @text_vectorizer.setter
+    def text_vectorizer(self, vectorizer):
+        self._text_vectorizer = vectorizer
+    
+    def feature_config(self):
+        """All settings that affect the feature vector, recorded with model artifacts"""
+        config = {
+            'video': self.video_config,
+            'audio': self.audio_config,
+            'text': self.text_config
+        }
+        if self.embedding_config is not None:
+            config['embedding'] = self.embedding_config
+        return config
+    
+    def _cached(self, video_path, modality, config, compute):
+        """Look up a modality's features in the cache, computing them on a miss"""
+        key, vector = self._cache_get(video_path, modality, config)
+        if vector is None:
+            vector = self._cache_put(key, compute(video_path))
+        return vector
+    
+    def _cache_get(self, video_path, modality, config):
+        """(key, vector) of a modality's cached features; vector is None on a miss
+        and key is None when there is nothing to cache under"""
+        if self.cache is None:
+            return None, None
+        
+        try:
+            key = self.cache.key(video_path, modality, config)
+        except OSError:
+            # Unreadable file - nothing to key on, let the extractor handle it
+            return None, None
+        
+        vector = self.cache.get(key)
+        increment('byteme_feature_cache_total', modality=modality, result='miss' if vector is None else 'hit')
+        return key, vector
+    
+    def _cache_put(self, key, vector):
+        if key is None:
+            return vector
+        return self.cache.put(key, vector)
+    
+    def extract_all(self, video_path, description="", progress=None):
+        """Combined video, audio and text feature vector of one video, as the model expects it
+        
+        progress, if given, is called as progress(modality, features) as soon as
+        each of 'video', 'audio', 'embedding' (when enabled) and 'text' is ready.
+        """
+        media_features = self.extract_media_features(video_path, progress)
+        text_features = self.extract_text_features(description)
+        if progress is not None:
+            progress('text', text_features)
+        return np.concatenate([media_features, text_features])
+    
+    def extract_media_features(self, video_path, progress=None):
+        """Video and audio (and frame embedding) features of one video
+        
+        Only modalities missing from the feature cache open the file. Frames
+        decoded for the video features are embedded as they are rather than
+        decoded a second time.
+        """
+        features, frames = self._extract_video_audio(video_path, progress)
+        if self.embedding_config is None:
+            return features
+        if frames is None:
+            # Video features came from the cache - decode only if the embedding misses too
+            embedding = self.extract_embedding_features(video_path)
+        else:
+            with timed('embedding'):
+                embedding = self._cached(video_path, 'embedding', self.embedding_config,
+                                         lambda path: self._embed_frames(frames, path))
+        if progress is not None:
+            progress('embedding', embedding)
+        return np.concatenate([features, embedding])
+    
+    def _extract_video_audio(self, video_path, progress=None):
+        """(video and audio features, decoded frames); frames is None when the
+        video features were cached and nothing was decoded"""
+        frames = None
+        with timed('video'):
+            video_key, video_features = self._cache_get(video_path, 'video', self.video_config)
+            if video_features is None:
+                frames = self._decode_frames(video_path)
+                video_features = self._cache_put(video_key, self._video_statistics(frames))
+        if progress is not None:
+            progress('video', video_features)
+        audio_features = self.extract_audio_features(video_path)
+        if progress is not None:
+            progress('audio', audio_features)
+        return np.concatenate([video_features, audio_features]), frames
+    
     def extract_video_features(self, video_path):
         """Extract basic video features"""
+        with timed('video'):
+            return self._cached(video_path, 'video', self.video_config, self._compute_video_features)
+    
+    def _compute_video_features(self, video_path):
+        """Extract basic video features without the cache"""
+        return self._video_statistics(self._decode_frames(video_path))
+    
+    def extract_embedding_features(self, video_path):
+        """Mean CNN embedding of the sampled frames (requires embedding_model)"""
+        if self.embedding_config is None:
+            raise ValueError("No embedding model configured")
+        with timed('embedding'):
+            return self._cached(video_path, 'embedding', self.embedding_config, self._compute_embedding_features)
+    
+    def _compute_embedding_features(self, video_path):
+        """Embed the sampled frames without the cache"""
+        return self._embed_frames(self._decode_frames(video_path), video_path)
+    
+    def _embed_frames(self, frames, video_path):
+        """Mean embedding of a video's decoded frame stack"""
+        if len(frames) == 0:
+            raise ValueError(f"No frames decoded from {video_path}")
+        return self.frame_embedder().embed_video(frames)
+    
+    def frame_embedder(self):
+        """The process-wide embedder for embedding_model, loaded on first use"""
+        if self.embedding_config is None:
+            raise ValueError("No embedding model configured")
+        return get_frame_embedder(self.embedding_model, self.embedding_batch_size)
+    
+    def _decode_frames(self, video_path):
+        """Sampled frames of a video, resized to frame_size, as one (N, S, S, 3) BGR stack"""
+        import cv2
         cap = cv2.VideoCapture(video_path)
-        features = []
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         
-        # Extract frames
-        frame_count = 0
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            # Resize frame
-            frame = cv2.resize(frame, (224, 224))
-            
-            # Convert to grayscale for simplicity
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            # Extract basic features
-            mean_brightness = np.mean(gray)
-            std_brightness = np.std(gray)
-            
-            features.append([mean_brightness, std_brightness])
-            frame_count += 1
+        # Preallocate the frame buffers once instead of a list per frame
+        frame_size = self.video_config['frame_size']
+        capacity = self.video_config['num_frames']
+        if total_frames > 0:
+            capacity = min(capacity, total_frames)
+        colour = np.empty((max(capacity, 1), frame_size, frame_size, 3), dtype=np.uint8)
+        
+        count = 0
+        for frame in self._sample_frames(cap, total_frames):
+            if count == len(colour):
+                # Frame count metadata was an underestimate - grow the buffer
+                colour = np.concatenate([colour, np.empty_like(colour)])
             
-            # Limit to first 30 frames for now
-            if frame_count >= 30:
-                break
+            cv2.resize(frame, (frame_size, frame_size), dst=colour[count])
+            count += 1
         
         cap.release()
+        if count == 0:
+            # Not a video (or a broken one) - don't let it pass as blank frames
+            raise UndecodableVideoError("No video frames could be decoded from the file")
+        return colour[:count]
+    
+    @classmethod
+    def _video_statistics(cls, colour):
+        """Video feature vector of a stack of sampled frames (zeros if there are none)"""
+        import cv2
+        if len(colour) == 0:
+            return np.zeros(VIDEO_FEATURE_DIM)
+        gray = np.empty(colour.shape[:3], dtype=np.uint8)
+        for index in range(len(colour)):
+            cv2.cvtColor(colour[index], cv2.COLOR_BGR2GRAY, dst=gray[index])
+        return cls._frame_statistics(colour, gray)
+    
+    @staticmethod
+    def _frame_statistics(colour, gray):
+        """Compute the video feature vector from stacked frames in one vectorized pass"""
+        import cv2
+        num_frames = len(gray)
+        pixels = gray.reshape(num_frames, -1)
         
-        if features:
-            # Average features across frames
-            return np.mean(features, axis=0)
-        return np.array([0, 0])
+        # Per-frame brightness, averaged across frames
+        frame_means = pixels.mean(axis=1)
+        frame_stds = pixels.std(axis=1)
+        
+        # Frame-to-frame differences: motion energy and hard cuts
+        if num_frames > 1:
+            frame_diffs = np.abs(np.diff(pixels.astype(np.int16), axis=0)).mean(axis=1)
+        else:
+            frame_diffs = np.zeros(1)
+        
+        # Exact 256-bin histogram per channel over the whole stack (treated as one
+        # tall image); gives the channel means and the coarse colour histogram
+        stacked = colour.reshape(-1, colour.shape[2], 3)
+        full_histogram = np.stack([
+            cv2.calcHist([stacked], [channel], None, [256], [0, 256]).ravel()
+            for channel in range(3)
+        ])
+        pixel_count = full_histogram[0].sum()
+        channel_means = full_histogram @ np.arange(256) / pixel_count
+        histogram = full_histogram.reshape(3, HISTOGRAM_BINS, -1).sum(axis=2).ravel() / pixel_count
+        
+        return np.concatenate([
+            [frame_means.mean(), frame_stds.mean(), frame_means.std()],
+            channel_means,
+            [frame_diffs.mean(), frame_diffs.max(), np.mean(frame_diffs > CUT_THRESHOLD)],
+            histogram
+        ])
+    
+    def _sample_frames(self, cap, total_frames):
+        """Yield the decoded frames selected by the frame sampling config"""
+        import cv2
+        num_frames = self.video_config['num_frames']
+        
+        if self.video_config['frame_sampling'] == 'sequential' or total_frames <= 0:
+            # Original behaviour: decode the first num_frames frames in order
+            for _ in range(num_frames):
+                ret, frame = cap.read()
+                if not ret:
+                    return
+                yield frame
+            return
+        
+        targets = self._frame_indices(total_frames)
+        position = 0
+        for target in targets:
+            gap = target - position
+            if gap > SEEK_MIN_GAP:
+                # Jump straight to the target instead of decoding everything in between
+                cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            else:
+                # Short gaps: grab() advances without the BGR conversion of retrieve()
+                for _ in range(gap):
+                    if not cap.grab():
+                        return
+            
+            ret, frame = cap.read()
+            if not ret:
+                return
+            position = target + 1
+            yield frame
+    
+    def _frame_indices(self, total_frames):
+        """Indices of the frames to sample from a clip of total_frames frames"""
+        num_frames = self.video_config['num_frames']
+        frame_stride = self.video_config['frame_stride']
+        
+        if frame_stride:
+            indices = np.arange(0, total_frames, frame_stride)[:num_frames]
+        else:
+            # Spread evenly over the whole duration
+            indices = np.linspace(0, total_frames - 1, min(num_frames, total_frames))
+        return np.unique(np.round(indices).astype(int))
     
     def extract_audio_features(self, video_path):
         """Extract basic audio features"""
+        with timed('audio'):
+            return self._cached(video_path, 'audio', self.audio_config, self._compute_audio_features)
+    
+    def _compute_audio_features(self, video_path):
+        """Extract basic audio features without the cache"""
         try:
-            # Extract audio from video
-            y, sr = librosa.load(video_path)
-            
-            # Extract basic features
-            mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=5)
-            spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr)
-            
-            # Average across time
-            mfcc_mean = np.mean(mfcc, axis=1)
-            spectral_centroid_mean = np.mean(spectral_centroid)
-            
-            return np.concatenate([mfcc_mean, [spectral_centroid_mean]])
+            if self.audio_config['backend'] == 'ffmpeg':
+                chunks = self._ffmpeg_pcm_chunks(video_path)
+            else:
+                chunks = self._librosa_pcm_chunks(video_path)
+            return self._audio_statistics(chunks)
         except:
             # Return zeros if audio extraction fails
-            return np.zeros(6)
+            increment('byteme_errors_total', stage='audio')
+            return np.zeros(self.audio_config['n_mfcc'] + 1)
     
-    def extract_text_features(self, description):
-        """Extract text features from description"""
-        if not description:
-            return np.zeros(100)
+    def _ffmpeg_pcm_chunks(self, video_path):
+        """Stream mono float32 PCM at the configured rate out of the container via ffmpeg"""
+        cmd = [FFMPEG_BINARY, '-nostdin', '-v', 'error', '-i', video_path]
+        if self.audio_config['max_duration']:
+            cmd += ['-t', str(self.audio_config['max_duration'])]
+        cmd += ['-vn', '-ac', '1', '-ar', str(self.audio_config['sample_rate']), '-f', 'f32le', 'pipe:1']
         
-        # Simple TF-IDF features
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
         try:
-            features = self.text_vectorizer.fit_transform([description])
-            feature_array = features.toarray()[0]
+            yield from self._read_pcm_chunks(process.stdout)
+        finally:
+            process.stdout.close()
+            process.kill()
+            process.wait()
+    
+    @staticmethod
+    def _read_pcm_chunks(stream):
+        """Float32 PCM chunks from a pipe of raw f32le samples"""
+        chunk_bytes = AUDIO_CHUNK_HOPS * AUDIO_HOP_LENGTH * 4
+        while True:
+            data = stream.read(chunk_bytes)
+            if not data:
+                break
+            yield np.frombuffer(data[:len(data) // 4 * 4], dtype=np.float32)
+    
+    def _librosa_pcm_chunks(self, video_path):
+        """Decode the whole audio track with librosa as a single chunk"""
+        y, _ = librosa.load(
+            video_path,
+            sr=self.audio_config['sample_rate'],
+            mono=True,
+            duration=self.audio_config['max_duration']
+        )
+        yield y
+    
+    def _audio_statistics(self, chunks):
+        """Mean MFCCs and spectral centroid over a stream of PCM chunks
+        
+        Frames are cut with the same hop across chunk boundaries, so the result
+        matches a single un-centered STFT over the whole signal while only one
+        chunk is held in memory.
+        """
+        sr = self.audio_config['sample_rate']
+        n_mfcc = self.audio_config['n_mfcc']
+        mfcc_sum = np.zeros(n_mfcc)
+        centroid_sum = 0.0
+        frame_total = 0
+        
+        def accumulate(samples):
+            nonlocal mfcc_sum, centroid_sum, frame_total
+            magnitude = np.abs(librosa.stft(samples, n_fft=AUDIO_N_FFT, hop_length=AUDIO_HOP_LENGTH, center=False))
+            mel = librosa.feature.melspectrogram(S=magnitude ** 2, sr=sr)
+            # No top_db clipping: it is relative to each chunk's peak and would make
+            # the result depend on where chunks are cut
+            mfcc = librosa.feature.mfcc(S=librosa.power_to_db(mel, top_db=None), n_mfcc=n_mfcc)
+            centroid = librosa.feature.spectral_centroid(S=magnitude, sr=sr, n_fft=AUDIO_N_FFT)
+            mfcc_sum += mfcc.sum(axis=1)
+            centroid_sum += centroid.sum()
+            frame_total += mfcc.shape[1]
+        
+        pending = np.zeros(0, dtype=np.float32)
+        for chunk in chunks:
+            pending = np.concatenate([pending, chunk])
+            if len(pending) < AUDIO_N_FFT:
+                continue
             
-            # Ensure we have exactly 100 features
-            if len(feature_array) < 100:
-                # Pad with zeros if needed
-                padded_features = np.zeros(100)
-                padded_features[:len(feature_array)] = feature_array
-                return padded_features
-            elif len(feature_array) > 100:
-                # Truncate if too many
-                return feature_array[:100]
+            # Process every complete frame and keep the overlap for the next chunk
+            frame_count = 1 + (len(pending) - AUDIO_N_FFT) // AUDIO_HOP_LENGTH
+            accumulate(pending[:(frame_count - 1) * AUDIO_HOP_LENGTH + AUDIO_N_FFT])
+            pending = pending[frame_count * AUDIO_HOP_LENGTH:]
+        
+        if frame_total == 0:
+            if len(pending) == 0:
+                raise ValueError("No audio decoded")
+            # Clip shorter than one frame - zero-pad it to a single frame
+            accumulate(np.pad(pending, (0, AUDIO_N_FFT - len(pending))))
+        
+        # Average across time
+        return np.concatenate([mfcc_sum / frame_total, [centroid_sum / frame_total]])
+    
+    def text_vectorizer_ready(self):
+        """Whether text features can be computed (hashing, or a fitted TF-IDF)"""
+        return self.text_config['vectorizer'] == 'hashing' or hasattr(self.text_vectorizer, 'vocabulary_')
+    
+    def fit_text_vectorizer(self, descriptions):
+        """Fit the TF-IDF vocabulary once over the training descriptions"""
+        if self.text_config['vectorizer'] == 'hashing':
+            return self
+        try:
+            self.text_vectorizer.fit([_clean_description(d) for d in descriptions])
+        except ValueError:
+            # No usable words in any description - text features stay zero
+            print("⚠️  Could not fit text vectorizer: no vocabulary in descriptions")
+        return self
+    
+    def extract_text_features(self, description):
+        """Extract text features from description"""
+        return self.extract_text_features_batch([description])[0]
+    
+    def extract_text_features_batch(self, descriptions):
+        """Extract text features for many descriptions in one sparse transform"""
+        descriptions = [_clean_description(d) for d in descriptions]
+        features = np.zeros((len(descriptions), TEXT_FEATURE_DIM))
+        if not descriptions or not self.text_vectorizer_ready():
+            return features
+        
+        # A small training corpus can give fewer than TEXT_FEATURE_DIM terms
+        with timed('text'):
+            matrix = self.text_vectorizer.transform(descriptions)
+            features[:, :matrix.shape[1]] = matrix.toarray()
+        return features
+    
+    def extract_many(self, video_paths, descriptions=None, workers=None, use_threads=False):
+        """Extract combined features for many videos across a process pool
+        
+        Returns (X, failures): X stacks the feature vectors of the videos that
+        succeeded, in input order, and failures maps the index of each video
+        that failed to its error message. use_threads runs a thread pool in this
+        process instead, which avoids process start-up cost for small batches
+        inside a server (decoding happens in OpenCV/ffmpeg outside the GIL).
+        """
+        items = list(video_paths)
+        if descriptions is None:
+            descriptions = [""] * len(items)
+        descriptions = list(descriptions)
+        
+        workers = min(workers or os.cpu_count() or 1, len(items))
+        if workers <= 1:
+            results = [_extract_media(self, item) for item in items]
+        elif use_threads:
+            # Each item runs in a copy of the caller's context, so its stage
+            # timings still land in the caller's request_scope
+            context = contextvars.copy_context()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(
+                    lambda item: context.copy().run(_extract_media, self, item), items
+                ))
+        else:
+            # spawn avoids forking a parent whose torch/OpenMP threads are already running
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self,)
+            ) as executor:
+                chunksize = max(1, len(items) // (workers * 4))
+                results = list(executor.map(_extract_item, items, chunksize=chunksize))
+        
+        vectors = []
+        valid_descriptions = []
+        failures = {}
+        for index, (vector, error) in enumerate(results):
+            if error is None:
+                vectors.append(vector)
+                valid_descriptions.append(descriptions[index])
             else:
-                return feature_array
-        except:
-            # Return zeros if TF-IDF fails
-            return np.zeros(100)
+                failures[index] = error
+        
+        if not vectors:
+            return np.empty((0, 0)), failures
+        
+        # Text features for the whole batch in a single sparse transform
+        text_features = self.extract_text_features_batch(valid_descriptions)
+        X = np.hstack([np.stack(vectors), text_features])
+        return X, failures
+
+# Extractor used by the current worker process of extract_many
+_worker_extractor = None
+
+def _init_worker(extractor):
+    """Set up a worker process for extract_many"""
+    import cv2
+    global _worker_extractor
+    _worker_extractor = extractor
+    # One OpenCV thread per worker - the pool already provides the parallelism
+    cv2.setNumThreads(1)
+
+def _extract_item(video_path):
+    """Process pool entry point for extract_many"""
+    return _extract_media(_worker_extractor, video_path)
+
+def _extract_media(extractor, video_path):
+    """Extract one video's video and audio features, returning (vector, error)"""
+    try:
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Video not found: {video_path}")
+        
+        return extractor.extract_media_features(video_path), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+def _clean_description(description):
+    """Descriptions can be missing (None/NaN in the dataset) - treat them as empty"""
+    return description if isinstance(description, str) else ""
 
 # Example usage
 if __name__ == "__main__":
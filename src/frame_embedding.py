@@ -0,0 +1,111 @@
+"""
+Visual frame embeddings from a small pretrained CNN, batched on the CPU
+
+The network is a TorchScript file on local disk, so serving needs neither the
+code that defined it nor network access. Any image model works once exported
+with save_embedding_model, e.g. a torchvision MobileNet without its classifier:
+
+    model = torchvision.models.mobilenet_v3_small(weights="DEFAULT")
+    save_embedding_model(model.features, "data/embedding/mobilenet_v3_small.ts")
+"""
+
+import os
+import hashlib
+import warnings
+import threading
+import numpy as np
+
+DEFAULT_EMBEDDING_MODEL = os.environ.get('BYTEME_EMBEDDING_MODEL') or None
+
+# Frames per forward pass - always this many, the last batch is padded - and
+# the intra-op threads used for it
+EMBEDDING_BATCH_SIZE = 16
+EMBEDDING_THREADS = int(os.environ.get('BYTEME_EMBEDDING_THREADS', 2))
+
+# Input normalisation the usual pretrained image models expect (RGB)
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+def weights_hash(path):
+    """SHA-256 of a weights file, so cached embeddings follow the model that made them"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def save_embedding_model(model, path, input_size=224, batch_size=EMBEDDING_BATCH_SIZE):
+    """Trace an image model at the fixed batch size, freeze it and save it as TorchScript"""
+    import torch
+    model = model.eval()
+    example = torch.zeros(batch_size, 3, input_size, input_size)
+    with warnings.catch_warnings(), torch.inference_mode():
+        # torch.jit warns about its planned replacement; it still works and the
+        # saved file loads without the code that defined the model
+        warnings.simplefilter('ignore', FutureWarning)
+        traced = torch.jit.freeze(torch.jit.trace(model, example))
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    traced.save(path)
+    return path
+
+class FrameEmbedder:
+    """Embeds stacks of BGR frames with a TorchScript CNN
+    
+    Frames run through the network batch_size at a time under
+    torch.inference_mode. torch's intra-op thread count is process-wide, so it
+    is capped at num_threads once, when the embedder is created, rather than
+    switched around each call. Feature maps are average-pooled over space;
+    embed_video then mean-pools over frames.
+    """
+    
+    def __init__(self, model_path, batch_size=EMBEDDING_BATCH_SIZE, num_threads=EMBEDDING_THREADS):
+        import torch
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', FutureWarning)
+            self.module = torch.jit.load(model_path, map_location='cpu').eval()
+        if torch.get_num_threads() > num_threads:
+            torch.set_num_threads(num_threads)
+        # Calls share one module; serialize them rather than oversubscribe the cores
+        self._lock = threading.Lock()
+    
+    def embed_frames(self, frames):
+        """(N, dim) float32 embeddings of N uint8 BGR frames of shape (N, H, W, 3)"""
+        import torch
+        if len(frames) == 0:
+            raise ValueError("No frames to embed")
+        
+        # BGR uint8 -> normalised RGB float, channels first
+        batch = (frames[..., ::-1].astype(np.float32) / 255 - IMAGENET_MEAN) / IMAGENET_STD
+        batch = np.ascontiguousarray(batch.transpose(0, 3, 1, 2))
+        padded = -len(batch) % self.batch_size
+        if padded:
+            batch = np.concatenate([batch, np.zeros((padded,) + batch.shape[1:], dtype=np.float32)])
+        
+        outputs = []
+        with self._lock, torch.inference_mode():
+            for start in range(0, len(batch), self.batch_size):
+                output = self.module(torch.from_numpy(batch[start:start + self.batch_size]))
+                if output.dim() == 4:
+                    # Feature maps - global average pool
+                    output = output.mean(dim=(2, 3))
+                outputs.append(output.reshape(output.shape[0], -1).numpy())
+        return np.concatenate(outputs)[:len(frames)]
+    
+    def embed_video(self, frames):
+        """One embedding per video: the mean over its frames"""
+        return self.embed_frames(frames).mean(axis=0)
+
+# Loaded models, one per weights file and process
+_embedders = {}
+_embedders_lock = threading.Lock()
+
+def get_frame_embedder(model_path, batch_size=EMBEDDING_BATCH_SIZE, num_threads=EMBEDDING_THREADS):
+    """The process-wide embedder for a weights file"""
+    key = (os.path.abspath(model_path), batch_size, num_threads)
+    with _embedders_lock:
+        if key not in _embedders:
+            _embedders[key] = FrameEmbedder(model_path, batch_size, num_threads)
+        return _embedders[key]
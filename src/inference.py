@@ -0,0 +1,160 @@
+"""
+Optimised inference for SimpleTikTokAnalyzer - scaler folded into the network,
+served by NumPy or TorchScript
+"""
+
+import os
+import warnings
+import numpy as np
+from model_artifacts import ARTIFACT_FORMAT_VERSION, DEFAULT_ARTIFACT_DIR, read_artifact_metadata, artifact_version_dir, load_artifact_extras
+
+# Files written next to model.pt by export_inference
+INFERENCE_WEIGHTS_FILE = "inference.npz"
+TORCHSCRIPT_FILE = "model.ts"
+QUANTIZED_FILE = "model_int8.ts"
+
+# numpy needs no torch import and is the fastest for a network this small;
+# auto picks it. torchscript runs the folded float model, quantized runs it
+# with int8 dynamic quantization of the hidden Linear layers.
+INFERENCE_BACKENDS = ('auto', 'numpy', 'torchscript', 'quantized')
+DEFAULT_INFERENCE_BACKEND = os.environ.get('BYTEME_INFERENCE_BACKEND', 'auto')
+
+def fold_scaler(model, scaler):
+    """Dense layers of the eval-mode model with the StandardScaler folded in
+    
+    Returns a list of (weight, bias) float32 arrays. Dropout is the identity in
+    eval mode, so only the Linear layers remain, separated by ReLUs. Since
+    W((x - mean) / scale) + b == (W / scale)x + (b - (W / scale)mean), the first
+    layer takes raw, unscaled features.
+    """
+    import torch.nn as nn
+    
+    linears = [module for module in model.network if isinstance(module, nn.Linear)]
+    layers = [
+        (module.weight.detach().cpu().numpy().astype(np.float64), module.bias.detach().cpu().numpy().astype(np.float64))
+        for module in linears
+    ]
+    weight, bias = layers[0]
+    weight = weight / scaler.scale_
+    bias = bias - weight @ scaler.mean_
+    layers[0] = (weight, bias)
+    return [(np.ascontiguousarray(w, dtype=np.float32), b.astype(np.float32)) for w, b in layers]
+
+def export_inference(model, scaler, version_dir):
+    """Write the folded weights, TorchScript and int8 TorchScript models into version_dir"""
+    import torch
+    import torch.nn as nn
+    from torch.ao.quantization import quantize_dynamic, default_dynamic_qconfig
+    
+    layers = fold_scaler(model, scaler)
+    np.savez(
+        os.path.join(version_dir, INFERENCE_WEIGHTS_FILE),
+        **{f"weight_{i}": w for i, (w, _) in enumerate(layers)},
+        **{f"bias_{i}": b for i, (_, b) in enumerate(layers)}
+    )
+    
+    modules = []
+    for i, (weight, bias) in enumerate(layers):
+        linear = nn.Linear(weight.shape[1], weight.shape[0])
+        with torch.no_grad():
+            linear.weight.copy_(torch.from_numpy(weight))
+            linear.bias.copy_(torch.from_numpy(bias))
+        modules.append(linear)
+        if i < len(layers) - 1:
+            modules.append(nn.ReLU())
+    folded = nn.Sequential(*modules).eval()
+    
+    with warnings.catch_warnings():
+        # torch.jit and torch.ao eager-mode quantization warn about their planned
+        # replacements; both still work and need no extra dependencies
+        warnings.simplefilter('ignore')
+        torch.jit.save(torch.jit.freeze(torch.jit.script(folded)), os.path.join(version_dir, TORCHSCRIPT_FILE))
+        
+        # The first layer sees raw features whose ranges differ by orders of magnitude,
+        # which int8 activations can't represent - keep it in float, quantize the rest
+        hidden = {str(index): default_dynamic_qconfig for index in range(2, len(modules), 2)}
+        quantized = quantize_dynamic(folded, hidden, dtype=torch.qint8)
+        torch.jit.save(torch.jit.script(quantized), os.path.join(version_dir, QUANTIZED_FILE))
+
+class NumpyInferenceEngine:
+    """Folded MLP evaluated with NumPy matrix products"""
+    
+    def __init__(self, layers):
+        self.layers = layers
+    
+    @classmethod
+    def load(cls, version_dir):
+        with np.load(os.path.join(version_dir, INFERENCE_WEIGHTS_FILE)) as weights:
+            count = sum(1 for name in weights.files if name.startswith('weight_'))
+            return cls([(weights[f"weight_{i}"], weights[f"bias_{i}"]) for i in range(count)])
+    
+    def predict(self, X):
+        hidden = np.asarray(X, dtype=np.float32)
+        last = len(self.layers) - 1
+        for i, (weight, bias) in enumerate(self.layers):
+            hidden = hidden @ weight.T
+            hidden += bias
+            if i < last:
+                np.maximum(hidden, 0, out=hidden)
+        return hidden
+
+class TorchScriptInferenceEngine:
+    """Exported TorchScript module run under inference_mode"""
+    
+    def __init__(self, module):
+        self.module = module
+    
+    @classmethod
+    def load(cls, path):
+        import torch
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', FutureWarning)
+            return cls(torch.jit.load(path, map_location='cpu'))
+    
+    def predict(self, X):
+        import torch
+        with torch.inference_mode():
+            return self.module(torch.from_numpy(np.asarray(X, dtype=np.float32))).numpy()
+
+class InferenceModel:
+    """A saved artifact loaded for serving
+    
+    Offers the predict/metadata/extras interface of TikTokModelTrainer, but takes
+    raw features straight into the compiled engine - the scaler is already part
+    of the first layer.
+    """
+    
+    def __init__(self, engine, metadata, extras, backend):
+        self.engine = engine
+        self.metadata = metadata
+        self.extras = extras
+        self.backend = backend
+    
+    def predict(self, X):
+        """Make predictions"""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return self.engine.predict(X)
+
+def load_inference_model(artifact_dir=DEFAULT_ARTIFACT_DIR, backend=DEFAULT_INFERENCE_BACKEND):
+    """Load the latest artifact for serving with the given inference backend"""
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    metadata = read_artifact_metadata(artifact_dir)
+    if metadata is None:
+        raise FileNotFoundError(f"No model artifact found in {artifact_dir}")
+    if metadata.get('format_version') != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format: {metadata.get('format_version')}")
+    
+    version_dir = artifact_version_dir(artifact_dir, metadata)
+    if backend in ('auto', 'numpy'):
+        backend = 'numpy'
+        engine = NumpyInferenceEngine.load(version_dir)
+    elif backend == 'torchscript':
+        engine = TorchScriptInferenceEngine.load(os.path.join(version_dir, TORCHSCRIPT_FILE))
+    else:
+        engine = TorchScriptInferenceEngine.load(os.path.join(version_dir, QUANTIZED_FILE))
+    
+    # The scaler isn't loaded - it lives inside the folded weights
+    return InferenceModel(engine, metadata, load_artifact_extras(artifact_dir, metadata), backend)
@@ -0,0 +1,161 @@
+"""
+In-process metrics - stage timings, counters, Prometheus text output and
+structured per-request timing logs
+"""
+
+import json
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+# Quantiles reported for every timing, over its most recent observations
+QUANTILES = (0.5, 0.95, 0.99)
+TIMING_WINDOW = 1024
+
+# Timings of the request being handled by the current thread (see request_scope);
+# worker threads that run in a copy of its context add to the same dict
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+_request_timings_lock = threading.Lock()
+
+def _quantile(sorted_values, q):
+    """Nearest-rank quantile of an already sorted list"""
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+class MetricsRegistry:
+    """Counters and timing summaries, safe to update from many threads
+    
+    Timings keep their total and count forever and a sliding window of recent
+    observations for the quantiles. Each process has its own registry, so
+    under gunicorn every worker reports its own numbers.
+    """
+    
+    def __init__(self, window=TIMING_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timings = {}
+        self._help = {}
+    
+    def describe(self, name, help_text):
+        """Set the HELP line of a metric"""
+        self._help[name] = help_text
+    
+    def increment(self, name, amount=1, **labels):
+        """Add to a counter"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+    
+    def observe(self, name, seconds, **labels):
+        """Record one duration"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            timing = self._timings.get(key)
+            if timing is None:
+                timing = self._timings[key] = {'sum': 0.0, 'count': 0, 'recent': deque(maxlen=self.window)}
+            timing['sum'] += seconds
+            timing['count'] += 1
+            timing['recent'].append(seconds)
+    
+    def quantiles(self, name, **labels):
+        """{quantile: seconds} over the recent observations of a timing, None if it has none"""
+        with self._lock:
+            timing = self._timings.get((name, _label_key(labels)))
+            recent = sorted(timing['recent']) if timing else []
+        if not recent:
+            return None
+        return {q: _quantile(recent, q) for q in QUANTILES}
+    
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0)
+    
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            timings = {key: (t['sum'], t['count'], sorted(t['recent'])) for key, t in self._timings.items()}
+        
+        lines = []
+        for metric_type, metrics in (('counter', counters), ('summary', timings)):
+            for name in sorted({name for name, _ in metrics}):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for (metric_name, label_key), value in sorted(metrics.items()):
+                    if metric_name != name:
+                        continue
+                    if metric_type == 'counter':
+                        lines.append(f"{name}{_format_labels(label_key)} {value}")
+                        continue
+                    total, count, recent = value
+                    for q in QUANTILES:
+                        quantile = _quantile(recent, q) if recent else float('nan')
+                        lines.append(f"{name}{_format_labels(label_key, [('quantile', q)])} {quantile:.6f}")
+                    lines.append(f"{name}_sum{_format_labels(label_key)} {total:.6f}")
+                    lines.append(f"{name}_count{_format_labels(label_key)} {count}")
+        return '\n'.join(lines) + '\n'
+
+# Process-wide registry used by the extractor and the server
+registry = MetricsRegistry()
+registry.describe('byteme_stage_seconds', 'Time spent in each stage of an analysis')
+registry.describe('byteme_feature_cache_total', 'Feature cache lookups by modality and result')
+registry.describe('byteme_result_cache_total', 'Analysis result cache lookups by result')
+registry.describe('byteme_heuristic_fallbacks_total', 'Analyses scored by the heuristic fallback instead of the model')
+registry.describe('byteme_errors_total', 'Errors by stage')
+
+def increment(name, amount=1, **labels):
+    registry.increment(name, amount, **labels)
+
+@contextmanager
+def timed(stage, metric='byteme_stage_seconds'):
+    """Time a block as one stage: recorded in the registry and in the current request's timings"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        registry.observe(metric, seconds, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            with _request_timings_lock:
+                timings[stage] = round(timings.get(stage, 0.0) + seconds * 1000, 3)
+
+@contextmanager
+def request_scope(logger, event, **fields):
+    """Collect the stage timings of one request and log them as a single JSON line
+    
+    Yields the fields dict, so the caller can add outcome details before the
+    line is written. Stage timings are in milliseconds.
+    """
+    timings = {}
+    token = _request_timings.set(timings)
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        yield fields
+    except Exception as e:
+        status = 'error'
+        fields['error'] = str(e)
+        raise
+    finally:
+        _request_timings.reset(token)
+        log_event(logger, event, status=status, total_ms=round((time.perf_counter() - start) * 1000, 3),
+                  stages_ms=timings, **fields)
+
+def log_event(logger, event, level=logging.INFO, **fields):
+    """Log one structured event as a JSON line"""
+    logger.log(level, json.dumps({'event': event, **fields}, default=str))
@@ -0,0 +1,79 @@
+"""
+Versioned model artifacts on disk - kept free of torch so serving can read them
+"""
+
+import json
+import os
+import pickle
+import shutil
+
+# Saved model artifacts live in versioned sub-directories of the artifact dir,
+# with a LATEST file pointing at the current one
+ARTIFACT_FORMAT_VERSION = 2
+DEFAULT_ARTIFACT_DIR = os.path.join("data", "model")
+LATEST_FILE = "LATEST"
+MODEL_FILE = "model.pt"
+SCALER_FILE = "scaler.pkl"
+METADATA_FILE = "metadata.json"
+SIMILARITY_INDEX_FILE = "similarity_index.npz"
+KEEP_ARTIFACT_VERSIONS = 3
+
+def artifact_version_dir(artifact_dir, metadata):
+    """Directory holding the files of the artifact described by metadata"""
+    return os.path.join(artifact_dir, "versions", metadata['artifact_version'])
+
+def load_artifact_scaler(artifact_dir, metadata):
+    """Load the fitted scaler saved with an artifact"""
+    with open(os.path.join(artifact_version_dir(artifact_dir, metadata), SCALER_FILE), 'rb') as f:
+        return pickle.load(f)
+
+def load_artifact_extras(artifact_dir, metadata):
+    """Load the extras (e.g. the text vectorizer) saved with an artifact"""
+    extras = {}
+    for name in metadata.get('extras', []):
+        with open(os.path.join(artifact_version_dir(artifact_dir, metadata), f"{name}.pkl"), 'rb') as f:
+            extras[name] = pickle.load(f)
+    return extras
+
+def read_latest_version(artifact_dir=DEFAULT_ARTIFACT_DIR):
+    """Version id the LATEST pointer refers to, or None if there is no artifact"""
+    try:
+        with open(os.path.join(artifact_dir, LATEST_FILE)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def read_artifact_metadata(artifact_dir=DEFAULT_ARTIFACT_DIR):
+    """Read the metadata of the latest artifact, or None if there is none"""
+    try:
+        version = read_latest_version(artifact_dir)
+        if version is None:
+            return None
+        with open(os.path.join(artifact_dir, "versions", version, METADATA_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def artifact_is_stale(artifact_dir=DEFAULT_ARTIFACT_DIR, feature_schema_version=None, dataset_fingerprint=None,
+                      feature_config=None):
+    """Check whether the saved artifact is missing or out of date"""
+    metadata = read_artifact_metadata(artifact_dir)
+    if metadata is None:
+        return True
+    if metadata.get('format_version') != ARTIFACT_FORMAT_VERSION:
+        return True
+    if feature_schema_version is not None and metadata.get('feature_schema_version') != feature_schema_version:
+        return True
+    if dataset_fingerprint is not None and metadata.get('dataset_fingerprint') != dataset_fingerprint:
+        return True
+    # Compare through JSON so tuples/lists and int/float keys match what was saved
+    if feature_config is not None and metadata.get('feature_config') != json.loads(json.dumps(feature_config)):
+        return True
+    return False
+
+def _prune_artifact_versions(artifact_dir, keep):
+    """Remove all but the newest `keep` artifact versions"""
+    versions_dir = os.path.join(artifact_dir, "versions")
+    versions = sorted(os.listdir(versions_dir))
+    for version in versions[:-keep]:
+        shutil.rmtree(os.path.join(versions_dir, version), ignore_errors=True)
@@ -0,0 +1,351 @@
+"""
+Nearest-neighbour index over combined feature vectors - "find similar videos"
+"""
+
+import os
+import json
+import threading
+import numpy as np
+from data_collector import SCORE_COLUMNS
+from model_artifacts import artifact_version_dir
+
+# 'exact' scores every row; 'ivf' only the k-means partitions nearest to the
+# query. 'auto' picks ivf once an index is built from IVF_MIN_ROWS rows or more
+INDEX_MODES = ('auto', 'exact', 'ivf')
+IVF_MIN_ROWS = 20000
+
+# Partitions searched per query in ivf mode, and the k-means settings used to
+# find the partitions (trained on a sample of KMEANS_SAMPLE_PER_LIST rows per list)
+IVF_PROBES = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+
+# Rows scored per matrix product, so a large index never needs a huge temporary
+SEARCH_CHUNK_ROWS = 65536
+
+# Cosine similarity above which a neighbour counts as the same video
+DUPLICATE_SIMILARITY = 0.99
+
+class SimilarityIndex:
+    """Cosine-similarity index over feature vectors, with the scores of each video
+    
+    Vectors are standardised with the column statistics of the rows the index
+    was built from (the raw features differ in scale by orders of magnitude)
+    and L2-normalised, so one matrix product gives the cosine similarities.
+    Rows can be appended at any time; storage grows by doubling, so an append
+    doesn't copy the index. Searches run concurrently with appends and see
+    the rows that were there when they started.
+    """
+    
+    def __init__(self, mean, scale, score_columns=SCORE_COLUMNS, mode='exact', centroids=None):
+        if mode not in INDEX_MODES[1:]:
+            raise ValueError(f"Unknown index mode: {mode}")
+        if mode == 'ivf' and centroids is None:
+            raise ValueError("An ivf index needs centroids")
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.scale = np.asarray(scale, dtype=np.float32)
+        self.score_columns = list(score_columns)
+        self.mode = mode
+        self.centroids = centroids
+        # Highest annotation row id the index has seen (indexed or failed)
+        self.last_row_id = 0
+        
+        dim = len(self.mean)
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._scores = np.empty((0, len(self.score_columns)), dtype=np.float32)
+        self._lists = np.empty(0, dtype=np.int32)
+        self._names = []
+        self._count = 0
+        # Rows grouped by ivf list: (row count it was built for, row order, list offsets)
+        self._list_order = None
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+    
+    @classmethod
+    def build(cls, X, ids, names, scores, score_columns=SCORE_COLUMNS, mode='auto', n_lists=None, last_row_id=None):
+        """Index the rows of X (which may be memory-mapped)
+        
+        ids are the annotation row ids of the rows, names their video names and
+        scores their (n, len(score_columns)) labels. ivf mode partitions the rows
+        into n_lists k-means clusters (default sqrt of the row count).
+        """
+        if mode not in INDEX_MODES:
+            raise ValueError(f"Unknown index mode: {mode}")
+        if len(X) == 0:
+            raise ValueError("No rows to index")
+        if mode == 'auto':
+            mode = 'ivf' if len(X) >= IVF_MIN_ROWS else 'exact'
+        
+        # Column statistics a chunk at a time - X may not fit in memory as float64
+        total = np.zeros(X.shape[1])
+        total_squares = np.zeros(X.shape[1])
+        for start in range(0, len(X), SEARCH_CHUNK_ROWS):
+            chunk = np.asarray(X[start:start + SEARCH_CHUNK_ROWS], dtype=np.float64)
+            total += chunk.sum(axis=0)
+            total_squares += (chunk ** 2).sum(axis=0)
+        mean = total / len(X)
+        scale = np.sqrt(np.maximum(total_squares / len(X) - mean ** 2, 0))
+        # Constant columns carry no information - leave them at zero
+        scale[scale < 1e-8] = 1
+        index = cls(mean, scale, score_columns, 'exact')
+        vectors = np.concatenate([index._prepare(X[start:start + SEARCH_CHUNK_ROWS])
+                                  for start in range(0, len(X), SEARCH_CHUNK_ROWS)])
+        if mode == 'ivf':
+            index.centroids = _spherical_kmeans(vectors, n_lists or int(np.sqrt(len(vectors))))
+            index.mode = 'ivf'
+        index._append(vectors, ids, names, scores)
+        index.last_row_id = int(max(ids)) if last_row_id is None else int(last_row_id)
+        return index
+    
+    def __len__(self):
+        return self._count
+    
+    @property
+    def dim(self):
+        return len(self.mean)
+    
+    def _prepare(self, X):
+        """Standardised, unit-length float32 copies of feature rows"""
+        vectors = (np.asarray(X, dtype=np.float32) - self.mean) / self.scale
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return vectors / norms
+    
+    def add(self, X, ids, names, scores):
+        """Append feature rows with their row ids, video names and scores"""
+        X = np.atleast_2d(X)
+        if X.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim} features, got {X.shape[1]}")
+        self._append(self._prepare(X), ids, names, scores)
+        with self._lock:
+            self.last_row_id = max(self.last_row_id, int(max(ids)))
+    
+    def _append(self, vectors, ids, names, scores):
+        lists = _assign(vectors, self.centroids) if self.mode == 'ivf' else np.zeros(len(vectors), dtype=np.int32)
+        with self._lock:
+            start = self._count
+            end = start + len(vectors)
+            if end > len(self._vectors):
+                # Double the capacity; searches in flight keep the old arrays
+                capacity = max(end, 2 * len(self._vectors))
+                self._vectors = _grow(self._vectors, capacity)
+                self._ids = _grow(self._ids, capacity)
+                self._scores = _grow(self._scores, capacity)
+                self._lists = _grow(self._lists, capacity)
+            self._vectors[start:end] = vectors
+            self._ids[start:end] = ids
+            self._scores[start:end] = scores
+            self._lists[start:end] = lists
+            self._names.extend(str(name) for name in names)
+            self._count = end
+    
+    def search(self, x, k=5, n_probe=IVF_PROBES, exclude_id=None):
+        """The k nearest indexed videos to one feature vector, most similar first"""
+        return self.search_many(np.atleast_2d(x), k, n_probe, exclude_id)[0]
+    
+    def search_many(self, X, k=5, n_probe=IVF_PROBES, exclude_id=None):
+        """Nearest neighbours of each row of X
+        
+        Each result is a list of {'id', 'video_name', 'similarity', 'scores'}
+        dicts. exclude_id leaves one row id out, e.g. the video being looked up.
+        """
+        X = np.atleast_2d(X)
+        if X.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim} features, got {X.shape[1]}")
+        queries = self._prepare(X)
+        
+        with self._lock:
+            count = self._count
+            vectors = self._vectors[:count]
+            ids = self._ids[:count]
+        if self.mode == 'ivf':
+            order, offsets = self._rows_by_list(count)
+        
+        results = []
+        for query in queries:
+            candidates = None
+            if self.mode == 'ivf':
+                probes = _top_k(query @ self.centroids.T, n_probe)
+                candidates = np.concatenate([order[offsets[probe]:offsets[probe + 1]] for probe in probes])
+            rows, similarities = self._nearest(vectors, query, candidates, k + (exclude_id is not None))
+            neighbours = [self._neighbour(row, similarity) for row, similarity in zip(rows, similarities)
+                          if exclude_id is None or ids[row] != exclude_id]
+            results.append(neighbours[:k])
+        return results
+    
+    def _rows_by_list(self, count):
+        """(rows sorted by ivf list, start offset of each list), rebuilt after appends"""
+        cached = self._list_order
+        if cached is None or cached[0] != count:
+            lists = self._lists[:count]
+            order = np.argsort(lists, kind='stable')
+            offsets = np.searchsorted(lists[order], np.arange(len(self.centroids) + 1))
+            cached = self._list_order = (count, order, offsets)
+        return cached[1], cached[2]
+    
+    @staticmethod
+    def _nearest(vectors, query, candidates, k):
+        """(rows, similarities) of the k rows most similar to query, among candidates if given"""
+        if candidates is not None:
+            similarities = vectors[candidates] @ query
+            order = _top_k(similarities, k)
+            return candidates[order], similarities[order]
+        
+        best_rows = np.empty(0, dtype=np.int64)
+        best = np.empty(0, dtype=np.float32)
+        for start in range(0, len(vectors), SEARCH_CHUNK_ROWS):
+            similarities = np.concatenate([best, vectors[start:start + SEARCH_CHUNK_ROWS] @ query])
+            rows = np.concatenate([best_rows, np.arange(start, start + len(similarities) - len(best))])
+            order = _top_k(similarities, k)
+            best_rows, best = rows[order], similarities[order]
+        return best_rows, best
+    
+    def _neighbour(self, row, similarity):
+        return {
+            'id': int(self._ids[row]),
+            'video_name': self._names[row],
+            'similarity': float(similarity),
+            'scores': dict(zip(self.score_columns, self._scores[row].tolist()))
+        }
+    
+    def vector(self, row_id):
+        """Stored (normalised) vector of an indexed row id, None if it isn't indexed"""
+        with self._lock:
+            rows = np.flatnonzero(self._ids[:self._count] == row_id)
+            if len(rows) == 0:
+                return None
+            return self._vectors[rows[0]]
+    
+    def neighbours_of(self, row_id, k=5, n_probe=IVF_PROBES):
+        """The k nearest videos to an indexed video, leaving the video itself out"""
+        vector = self.vector(row_id)
+        if vector is None:
+            raise KeyError(f"Video {row_id} is not in the index")
+        # Undo the standardisation - search_many applies it again
+        return self.search(vector * self.scale + self.mean, k, n_probe, exclude_id=row_id)
+    
+    def update_from(self, collector, extractor, workers=None, use_threads=False):
+        """Index the collector's videos added since the index last saw the dataset
+        
+        Returns how many were added. Videos whose features can't be extracted
+        are skipped but still count as seen, like in update_ai_model.
+        """
+        with self._update_lock:
+            rows = list(collector.iter_videos(after_id=self.last_row_id))
+            if not rows:
+                return 0
+            X, failures = extractor.extract_many([row['video_path'] for row in rows],
+                                                 [row['description'] for row in rows],
+                                                 workers=workers, use_threads=use_threads)
+            valid = [row for index, row in enumerate(rows) if index not in failures]
+            if valid:
+                self.add(X, [row['id'] for row in valid], [row['video_name'] for row in valid],
+                         [[row[column] for column in self.score_columns] for row in valid])
+            with self._lock:
+                self.last_row_id = max(self.last_row_id, max(row['id'] for row in rows))
+            return len(valid)
+    
+    def save(self, path):
+        """Write the index to one .npz file, atomically"""
+        with self._lock:
+            count = self._count
+            arrays = {
+                'vectors': self._vectors[:count],
+                'ids': self._ids[:count],
+                'scores': self._scores[:count],
+                'lists': self._lists[:count],
+                'names': np.array(self._names[:count], dtype=str),
+                'mean': self.mean,
+                'scale': self.scale,
+                'centroids': self.centroids if self.centroids is not None else np.empty((0, self.dim), np.float32),
+                'info': np.array(json.dumps({
+                    'mode': self.mode,
+                    'score_columns': self.score_columns,
+                    'last_row_id': self.last_row_id
+                }))
+            }
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+        return path
+    
+    @classmethod
+    def load(cls, path):
+        """Load an index written by save"""
+        with np.load(path, allow_pickle=False) as data:
+            info = json.loads(str(data['info']))
+            centroids = data['centroids'] if info['mode'] == 'ivf' else None
+            index = cls(data['mean'], data['scale'], info['score_columns'], info['mode'], centroids)
+            with index._lock:
+                index._vectors = data['vectors']
+                index._ids = data['ids']
+                index._scores = data['scores']
+                index._lists = data['lists']
+                index._names = data['names'].tolist()
+                index._count = len(index._ids)
+        index.last_row_id = info['last_row_id']
+        return index
+
+def similarity_index_path(artifact_dir, metadata):
+    """Path of the similarity index saved with an artifact, None if it has none"""
+    if not metadata.get('similarity_index'):
+        return None
+    return os.path.join(artifact_version_dir(artifact_dir, metadata), metadata['similarity_index'])
+
+def load_artifact_similarity_index(artifact_dir, metadata):
+    """Load the similarity index saved with an artifact, None if it has none"""
+    path = similarity_index_path(artifact_dir, metadata)
+    if path is None or not os.path.exists(path):
+        return None
+    return SimilarityIndex.load(path)
+
+def follow_collector(index, collector, extractor, path=None):
+    """Index videos as collector adds them, saving the index to path after each add"""
+    def on_add(row_ids):
+        try:
+            if index.update_from(collector, extractor, workers=1) and path:
+                index.save(path)
+        except Exception as e:
+            # The rows are stored either way; the next update picks them up
+            print(f"⚠️  Could not add videos {row_ids} to the similarity index: {e}")
+    collector.subscribe(on_add)
+    return collector
+
+def _grow(array, capacity):
+    grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+def _top_k(values, k):
+    """Indices of the k largest values, largest first"""
+    k = min(k, len(values))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-values, k - 1)[:k]
+    return top[np.argsort(-values[top], kind='stable')]
+
+def _assign(vectors, centroids):
+    """Nearest centroid of each (unit-length) vector"""
+    lists = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), SEARCH_CHUNK_ROWS):
+        lists[start:start + SEARCH_CHUNK_ROWS] = np.argmax(vectors[start:start + SEARCH_CHUNK_ROWS] @ centroids.T, axis=1)
+    return lists
+
+def _spherical_kmeans(vectors, n_lists, iterations=KMEANS_ITERATIONS, seed=0):
+    """Unit-length k-means centroids of a sample of the vectors"""
+    rng = np.random.default_rng(seed)
+    n_lists = max(1, min(n_lists, len(vectors)))
+    sample_size = min(len(vectors), n_lists * KMEANS_SAMPLE_PER_LIST)
+    sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    
+    for _ in range(iterations):
+        assignment = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Empty clusters keep their previous centroid
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+    return centroids.astype(np.float32)
@@ -1,13 +1,39 @@
+import json
+import os
+import pickle
+import time
+import uuid
+import copy
 import torch
 import torch.nn as nn
 import torch.optim as optim
+from torch.utils.data import Dataset, DataLoader, BatchSampler, RandomSampler, SequentialSampler
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 import numpy as np
+from model_artifacts import (
+    ARTIFACT_FORMAT_VERSION, DEFAULT_ARTIFACT_DIR, LATEST_FILE, MODEL_FILE, SCALER_FILE, METADATA_FILE,
+    SIMILARITY_INDEX_FILE, KEEP_ARTIFACT_VERSIONS, read_artifact_metadata, artifact_version_dir,
+    load_artifact_scaler, load_artifact_extras, _prune_artifact_versions
+)
+from inference import export_inference
+
+# Learning rate schedules supported by TikTokModelTrainer.train
+LR_SCHEDULES = ('plateau', 'cosine', None)
+
+# Rows scaled at once when fitting the scaler or predicting
+SCALER_CHUNK_ROWS = 4096
+
+def default_hidden_dim(input_dim):
+    """Hidden layer width for an input size: 64 for the hand-crafted features,
+    wider (up to 256) when frame embeddings add a few hundred inputs"""
+    return max(64, min(256, input_dim // 4))
 
 class SimpleTikTokAnalyzer(nn.Module):
-    def __init__(self, input_dim, hidden_dim=64):
+    def __init__(self, input_dim, hidden_dim=None):
         super().__init__()
+        if hidden_dim is None:
+            hidden_dim = default_hidden_dim(input_dim)
         
         # Simple neural network
         self.network = nn.Sequential(
@@ -23,16 +49,55 @@ class SimpleTikTokAnalyzer(nn.Module):
     def forward(self, x):
         return self.network(x)
 
+class ScaledFeatureDataset(Dataset):
+    """Rows of a (possibly memory-mapped) feature matrix, scaled batch by batch
+    
+    Indexed with a whole list of row indices at a time, so a DataLoader built
+    on a BatchSampler reads each mini-batch as one sorted slice instead of row
+    by row, and the full scaled matrix never has to exist in memory.
+    """
+    
+    def __init__(self, X, y, scaler):
+        self.X = X
+        self.y = y
+        self.scaler = scaler
+    
+    def __len__(self):
+        return len(self.X)
+    
+    def __getitem__(self, indices):
+        indices = np.sort(indices)
+        X_batch = self.scaler.transform(np.asarray(self.X[indices]))
+        y_batch = np.asarray(self.y[indices])
+        return torch.as_tensor(X_batch, dtype=torch.float32), torch.as_tensor(y_batch, dtype=torch.float32)
+
 class TikTokModelTrainer:
     def __init__(self):
         self.model = None
         self.scaler = StandardScaler()
+        self.metadata = {}
+        self.extras = {}
+        self.history = []
+        self.best_epoch = None
+        
+    def prepare_data(self, features, scores, incremental=False, shuffle=True):
+        """Prepare data for training
         
-    def prepare_data(self, features, scores):
-        """Prepare data for training"""
-        # Normalize features
-        X = self.scaler.fit_transform(features)
-        y = np.array(scores)
+        Fits the scaler and returns the train/test split unscaled; train() and
+        predict() apply the scaler themselves. With incremental=True the scaler
+        statistics are updated with the new features (partial_fit) instead of
+        being refitted from scratch. shuffle=False is for rows already stored in
+        random order, like a compiled dataset: the split is then two zero-copy
+        slices, so memory-mapped features stay on disk.
+        """
+        X = features
+        y = scores if isinstance(scores, np.ndarray) else np.asarray(scores)
+        
+        # Normalize features, a chunk of rows at a time so memmaps aren't loaded whole
+        if not incremental:
+            self.scaler = StandardScaler()
+        for start in range(0, len(X), SCALER_CHUNK_ROWS):
+            self.scaler.partial_fit(X[start:start + SCALER_CHUNK_ROWS])
         
         # Check if we have enough data for train/test split
         if len(X) < 2:
@@ -42,54 +107,134 @@ class TikTokModelTrainer:
         elif len(X) < 5:
             # If less than 5 samples, use smaller test size
             test_size = 0.1  # 10% for testing
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=test_size, random_state=42
-            )
         else:
             # Normal split for larger datasets
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=0.2, random_state=42
-            )
+            test_size = 0.2
+        
+        if not shuffle:
+            n_test = max(1, int(np.ceil(len(X) * test_size)))
+            return X[:-n_test], X[-n_test:], y[:-n_test], y[-n_test:]
         
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=test_size, random_state=42
+        )
         return X_train, X_test, y_train, y_test
     
-    def train(self, X_train, y_train, epochs=100):
-        """Train the model"""
+    def train(self, X_train, y_train, epochs=100, warm_start=False, lr=0.001, X_val=None, y_val=None,
+              batch_size=32, patience=10, lr_schedule='plateau', num_threads=None):
+        """Train the model with mini-batches, validation tracking and early stopping
+        
+        X_train/X_val are unscaled and may be memory-mapped. Each epoch is scored
+        on the validation set (the training set if none is given); training stops
+        once that loss hasn't improved for `patience` epochs and the best weights
+        are restored. warm_start fine-tunes the current weights instead of
+        starting from a fresh random initialisation.
+        """
+        if lr_schedule not in LR_SCHEDULES:
+            raise ValueError(f"Unknown LR schedule: {lr_schedule}")
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        
         input_dim = X_train.shape[1]
-        self.model = SimpleTikTokAnalyzer(input_dim)
+        if not (warm_start and self.model is not None and self.model.network[0].in_features == input_dim):
+            # A warm start can't reuse weights trained on a different feature layout
+            self.model = SimpleTikTokAnalyzer(input_dim)
         
-        # Convert to PyTorch tensors
-        X_train_tensor = torch.FloatTensor(X_train)
-        y_train_tensor = torch.FloatTensor(y_train)
+        train_loader = self._loader(X_train, y_train, batch_size, shuffle=True)
+        if X_val is None:
+            val_loader = self._loader(X_train, y_train, batch_size, shuffle=False)
+        else:
+            val_loader = self._loader(X_val, y_val, batch_size, shuffle=False)
         
         # Loss and optimizer
         criterion = nn.MSELoss()
-        optimizer = optim.Adam(self.model.parameters(), lr=0.001)
+        optimizer = optim.Adam(self.model.parameters(), lr=lr)
+        if lr_schedule == 'plateau':
+            scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, factor=0.5, patience=max(1, patience // 3))
+        elif lr_schedule == 'cosine':
+            scheduler = optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=max(1, epochs))
+        else:
+            scheduler = None
+        
+        best_loss = float('inf')
+        best_state = None
+        epochs_without_improvement = 0
+        self.history = []
         
         # Training loop
         for epoch in range(epochs):
-            optimizer.zero_grad()
-            outputs = self.model(X_train_tensor)
-            loss = criterion(outputs, y_train_tensor)
-            loss.backward()
-            optimizer.step()
+            self.model.train()
+            train_loss = 0.0
+            for X_batch, y_batch in train_loader:
+                optimizer.zero_grad()
+                outputs = self.model(X_batch)
+                loss = criterion(outputs, y_batch)
+                loss.backward()
+                optimizer.step()
+                train_loss += loss.item() * len(X_batch)
+            train_loss /= len(train_loader.dataset)
+            
+            val_loss = self._loss(val_loader, criterion)
+            self.history.append({
+                'epoch': epoch,
+                'train_loss': train_loss,
+                'val_loss': val_loss,
+                'lr': optimizer.param_groups[0]['lr']
+            })
+            
+            if scheduler is not None:
+                scheduler.step(val_loss) if lr_schedule == 'plateau' else scheduler.step()
+            
+            # Keep the best checkpoint
+            if val_loss < best_loss:
+                best_loss = val_loss
+                best_state = copy.deepcopy(self.model.state_dict())
+                self.best_epoch = epoch
+                epochs_without_improvement = 0
+            else:
+                epochs_without_improvement += 1
             
             if epoch % 10 == 0:
-                print(f'Epoch {epoch}, Loss: {loss.item():.4f}')
+                print(f'Epoch {epoch}, Loss: {train_loss:.4f}, Val Loss: {val_loss:.4f}')
+            
+            if patience and epochs_without_improvement >= patience:
+                print(f'Early stopping at epoch {epoch} (best epoch {self.best_epoch}, val loss {best_loss:.4f})')
+                break
+        
+        if best_state is not None:
+            self.model.load_state_dict(best_state)
+        self.model.eval()
+        return self.history
+    
+    def _loader(self, X, y, batch_size, shuffle):
+        """DataLoader yielding scaled mini-batches, one sorted slice per batch"""
+        dataset = ScaledFeatureDataset(X, y, self.scaler)
+        sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+        return DataLoader(dataset, sampler=BatchSampler(sampler, batch_size, drop_last=False), batch_size=None)
+    
+    def _loss(self, loader, criterion):
+        """Mean loss of the model over a loader"""
+        self.model.eval()
+        total = 0.0
+        with torch.no_grad():
+            for X_batch, y_batch in loader:
+                total += criterion(self.model(X_batch), y_batch).item() * len(X_batch)
+        return total / len(loader.dataset)
     
     def predict(self, X):
         """Make predictions"""
         if self.model is None:
             raise ValueError("Model not trained yet")
         
-        X_scaled = self.scaler.transform(X)
-        X_tensor = torch.FloatTensor(X_scaled)
-        
         self.model.eval()
+        predictions = []
         with torch.no_grad():
-            predictions = self.model(X_tensor)
+            # Scale in chunks so a memory-mapped X is never loaded whole
+            for start in range(0, len(X), SCALER_CHUNK_ROWS):
+                X_scaled = self.scaler.transform(X[start:start + SCALER_CHUNK_ROWS])
+                predictions.append(self.model(torch.FloatTensor(X_scaled)).numpy())
         
-        return predictions.numpy()
+        return np.concatenate(predictions)
     
     def evaluate(self, X_test, y_test):
         """Evaluate model performance"""
@@ -100,11 +245,86 @@ class TikTokModelTrainer:
         score_names = ['accuracy', 'homogeneity', 'comedy', 'theatrism', 'coherence']
         
         for i, name in enumerate(score_names):
-            mse = np.mean((y_test[:, i] - predictions[:, i]) ** 2)
-            mae = np.mean(np.abs(y_test[:, i] - predictions[:, i]))
+            mse = float(np.mean((y_test[:, i] - predictions[:, i]) ** 2))
+            mae = float(np.mean(np.abs(y_test[:, i] - predictions[:, i])))
             metrics[name] = {'mse': mse, 'mae': mae}
         
         return metrics
+    
+    def save(self, artifact_dir=DEFAULT_ARTIFACT_DIR, feature_schema_version=None, feature_config=None,
+             metadata=None, extras=None, similarity_index=None):
+        """Save model weights, scaler and metadata as a new artifact version
+        
+        extras maps names to picklable objects that belong with the model (such as
+        the fitted text vectorizer); they are restored into trainer.extras on load.
+        similarity_index, if given, is saved alongside (see similarity_index).
+        """
+        if self.model is None:
+            raise ValueError("Model not trained yet")
+        
+        version = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        version_dir = os.path.join(artifact_dir, "versions", version)
+        os.makedirs(version_dir)
+        
+        first_layer = self.model.network[0]
+        self.metadata = {
+            'format_version': ARTIFACT_FORMAT_VERSION,
+            'artifact_version': version,
+            'feature_schema_version': feature_schema_version,
+            'feature_config': feature_config,
+            'extras': sorted(extras or {}),
+            'input_dim': first_layer.in_features,
+            'hidden_dim': first_layer.out_features,
+            'created_at': time.time(),
+            **(metadata or {})
+        }
+        
+        torch.save(self.model.state_dict(), os.path.join(version_dir, MODEL_FILE))
+        with open(os.path.join(version_dir, SCALER_FILE), 'wb') as f:
+            pickle.dump(self.scaler, f)
+        for name, obj in (extras or {}).items():
+            with open(os.path.join(version_dir, f"{name}.pkl"), 'wb') as f:
+                pickle.dump(obj, f)
+        self.extras = dict(extras or {})
+        if similarity_index is not None:
+            similarity_index.save(os.path.join(version_dir, SIMILARITY_INDEX_FILE))
+            self.metadata['similarity_index'] = SIMILARITY_INDEX_FILE
+        # Compiled inference engines with the scaler folded in, used for serving
+        export_inference(self.model, self.scaler, version_dir)
+        with open(os.path.join(version_dir, METADATA_FILE), 'w') as f:
+            json.dump(self.metadata, f, indent=2, default=float)
+        
+        # Switch LATEST atomically so readers never see a half-written bundle
+        tmp_latest = os.path.join(artifact_dir, f".{LATEST_FILE}.{version}")
+        with open(tmp_latest, 'w') as f:
+            f.write(version)
+        os.replace(tmp_latest, os.path.join(artifact_dir, LATEST_FILE))
+        
+        _prune_artifact_versions(artifact_dir, keep=KEEP_ARTIFACT_VERSIONS)
+        return version_dir
+    
+    @classmethod
+    def load(cls, artifact_dir=DEFAULT_ARTIFACT_DIR):
+        """Load the latest saved artifact into a ready-to-predict trainer"""
+        metadata = read_artifact_metadata(artifact_dir)
+        if metadata is None:
+            raise FileNotFoundError(f"No model artifact found in {artifact_dir}")
+        if metadata.get('format_version') != ARTIFACT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported artifact format: {metadata.get('format_version')}")
+        
+        version_dir = artifact_version_dir(artifact_dir, metadata)
+        
+        trainer = cls()
+        trainer.model = SimpleTikTokAnalyzer(metadata['input_dim'], hidden_dim=metadata['hidden_dim'])
+        state_dict = torch.load(os.path.join(version_dir, MODEL_FILE), map_location='cpu', weights_only=True)
+        trainer.model.load_state_dict(state_dict)
+        trainer.model.eval()
+        
+        trainer.scaler = load_artifact_scaler(artifact_dir, metadata)
+        trainer.extras = load_artifact_extras(artifact_dir, metadata)
+        trainer.metadata = metadata
+        
+        return trainer
 
 # Example usage
 if __name__ == "__main__":
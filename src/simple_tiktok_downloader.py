@@ -4,62 +4,35 @@ Simple TikTok video downloader and dataset manager
 """
 
 import os
-import subprocess
 import sys
 sys.path.append('src')
 from data_collector import TikTokDataCollector
+from download_manager import DownloadError, get_download_manager
 
 def download_tiktok_video(url, output_dir="data/videos"):
-    """Download TikTok video using yt-dlp"""
+    """Download TikTok video using yt-dlp
     
-    # Create output directory
-    os.makedirs(output_dir, exist_ok=True)
+    Returns (video_path, filename), where filename is the video title plus its
+    extension, or (None, None) if the download failed. Safe to call from many
+    threads: the shared download manager saves each URL to its own path and
+    downloads a URL only once.
+    """
     
-    # Change to output directory
-    original_dir = os.getcwd()
-    os.chdir(output_dir)
+    print(f"📱 Downloading TikTok video...")
     
     try:
-        # Use yt-dlp command line
-        cmd = [
-            'yt-dlp',
-            '--format', 'best',
-            '--output', '%(title)s.%(ext)s',
-            '--no-playlist',
-            url
-        ]
-        
-        print(f"📱 Downloading TikTok video...")
-        
-        # Run the download command
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            print("✅ Download successful!")
-            
-            # Find the downloaded file
-            files = [f for f in os.listdir('.') if f.endswith(('.mp4', '.webm', '.mkv'))]
-            if files:
-                # Get the most recent file
-                latest_file = max(files, key=lambda x: os.path.getctime(x))
-                print(f"📁 Downloaded: {latest_file}")
-                return os.path.join(output_dir, latest_file), latest_file
-            else:
-                print("❌ No video file found")
-                return None, None
-        else:
-            print(f"❌ Download failed: {result.stderr}")
-            return None, None
-            
-    except Exception as e:
-        print(f"❌ Error: {e}")
+        video_path, title = get_download_manager(output_dir).download(url)
+    except DownloadError as e:
+        print(f"❌ Download failed: {e}")
         return None, None
-    finally:
-        # Change back to original directory
-        os.chdir(original_dir)
+    
+    filename = title + os.path.splitext(video_path)[1]
+    print("✅ Download successful!")
+    print(f"📁 Downloaded: {filename}")
+    return video_path, filename
 
-def add_tiktok_video_to_dataset(url, scores, description=""):
-    """Complete pipeline: Download + Add to dataset"""
+def add_tiktok_video_to_dataset(url, scores, description="", collector=None):
+    """Complete pipeline: Download + Add to dataset (through collector, if given)"""
     
     print(f"🎬 Processing TikTok video: {url}")
     print("=" * 50)
@@ -72,7 +45,7 @@ def add_tiktok_video_to_dataset(url, scores, description=""):
         return False
     
     # Step 2: Add to dataset
-    collector = TikTokDataCollector()
+    collector = collector or TikTokDataCollector()
     
     # Create description from filename if not provided
     if not description:
@@ -0,0 +1,51 @@
+"""
+Parity of the compiled inference backends with the eager model
+
+One small model is trained on synthetic features and saved as an artifact;
+every backend loaded from it must match TikTokModelTrainer.predict within
+the tolerance benchmarks/inference_engines.py allows it.
+"""
+
+import os
+import sys
+import json
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+from inference import load_inference_model
+from model_artifacts import METADATA_FILE, read_artifact_metadata, artifact_version_dir
+from inference_engines import PARITY_TOLERANCE, make_model
+
+@pytest.fixture(scope="module")
+def toy_model(tmp_path_factory):
+    """Trainer and features of a toy model saved to a temporary artifact dir"""
+    artifact_dir = str(tmp_path_factory.mktemp("model"))
+    trainer, X = make_model(artifact_dir, input_dim=24, n_samples=128, epochs=3)
+    return artifact_dir, trainer, X
+
+@pytest.mark.parametrize("backend", list(PARITY_TOLERANCE))
+def test_backend_matches_eager_model(toy_model, backend):
+    artifact_dir, trainer, X = toy_model
+    model = load_inference_model(artifact_dir, backend=backend)
+    
+    error = np.abs(model.predict(X) - trainer.predict(X)).max()
+    assert error <= PARITY_TOLERANCE[backend]
+
+def test_incompatible_artifact_format_is_refused(toy_model):
+    artifact_dir, _, _ = toy_model
+    metadata = read_artifact_metadata(artifact_dir)
+    metadata_path = os.path.join(artifact_version_dir(artifact_dir, metadata), METADATA_FILE)
+    with open(metadata_path) as f:
+        original = f.read()
+    
+    try:
+        with open(metadata_path, 'w') as f:
+            json.dump(dict(metadata, format_version=metadata['format_version'] - 1), f)
+        with pytest.raises(ValueError, match="Unsupported artifact format"):
+            load_inference_model(artifact_dir)
+    finally:
+        with open(metadata_path, 'w') as f:
+            f.write(original)